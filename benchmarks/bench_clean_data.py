@@ -0,0 +1,87 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+import results
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cleaning_data_scripts"))
+from cleaning_data_script import clean_data
+
+BRANDS = ["Apple", "Samsung", "HP", "Dell", "Lenovo", "ASUS", "Acer", "Xiaomi", "OnePlus", "Realme"]
+PROCESSORS = [
+    "Intel Core i5-1135G7 (8M Cache, up to 4.2 GHz)", "Apple M2 Processor", "Snapdragon 8 Gen 2 Mobile Processor",
+    "AMD Ryzen 5, Ryzen 5 5500U", "Intel Core i7-1255U Processor", "MediaTek Dimensity 7050", None,
+]
+RAMS = ["4 GB", "8 GB", "16GB", "Up to 32 GB", "12 GB", None]
+STORAGES = ["64 GB", "128 GB", "256GB", "512 GB", "1024 GB", None]
+CURRENCIES = ["US ${:,.2f}", "EUR {:,.2f}", "GBP {:,.2f}", "₹{:,.0f}"]
+
+
+def synthetic_raw_data(rows: int, seed: int = 0, website: str = "ebay", category: str = "laptops") -> pd.DataFrame:
+    """Raw rows shaped like the scrapers' output, with the repetition of real listings."""
+    rng = np.random.default_rng(seed)
+    models = np.array([f"Model {i}, {rng.integers(4, 17)}GB" for i in range(max(rows // 50, 10))], dtype=object)
+    prices = np.array([rng.choice(CURRENCIES).format(rng.uniform(50, 3000)) for _ in range(max(rows // 20, 10))], dtype=object)
+    dates = pd.date_range("2025-01-01", periods=30).strftime("%Y-%m-%d").to_numpy(dtype=object)
+
+    def pick(values: list, nulls: float = 0.0) -> np.ndarray:
+        picked = np.asarray(values, dtype=object)[rng.integers(0, len(values), rows)]
+        if nulls:
+            picked[rng.random(rows) < nulls] = np.nan
+        return picked
+
+    brands = pick(BRANDS, nulls=0.01)
+    model_names = pick(models, nulls=0.01)
+    # some models repeat the brand, the cleaning removes it
+    with_brand = rng.random(rows) < 0.3
+    model_names[with_brand] = [f"{brand} {model}" for brand, model in zip(brands[with_brand], model_names[with_brand])]
+
+    return pd.DataFrame({
+        "brand": brands,
+        "model": model_names,
+        "processor": pick(PROCESSORS),
+        "ram": pick(RAMS),
+        "storage": pick(STORAGES),
+        "price": pick(prices, nulls=0.01),
+        "website": website,
+        "category": category,
+        "scraping_date": pick(dates),
+        "promotion": pick(["discount", "no discount"]),
+    })
+
+
+def measure(df: pd.DataFrame) -> tuple:
+    # wall time and peak memory allocated while cleaning (numpy and pandas buffers are traced too)
+    tracemalloc.start()
+    start = time.perf_counter()
+    cleaned = clean_data(df)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, cleaned
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark clean_data on synthetic raw data")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="e.g. 10000000 for 10M rows")
+    results.add_arguments(parser)
+    args = parser.parse_args()
+
+    measured = {}
+    for rows in args.rows:
+        df = synthetic_raw_data(rows)
+        input_mb = df.memory_usage(deep=True).sum() / 2**20
+        elapsed, peak, cleaned = measure(df)
+        print(f"{rows:>10} rows ({input_mb:8.1f} MB): clean_data {elapsed:8.3f}s  peak memory {peak / 2**20:8.1f} MB  "
+              f"output {cleaned.memory_usage(deep=True).sum() / 2**20:8.1f} MB, {len(cleaned)} rows")
+        measured[f"{rows} rows"] = {"clean_s": elapsed, "peak_mb": peak / 2**20}
+
+    sys.exit(results.report(args, measured))
+
+
+if __name__ == "__main__":
+    main()
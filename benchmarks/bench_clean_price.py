@@ -0,0 +1,54 @@
+import argparse
+import os
+import random
+import sys
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cleaning_data_scripts"))
+from cleaning_data_script import clean_price, clean_prices
+
+# price formats seen on the three sites, plus missing and malformed values
+PRICE_FORMATS = ["US ${:,.2f}", "EUR {:,.2f}", "GBP {:,.2f}", "AU ${:,.2f}", "C ${:,.2f}", "₹{:,.0f}", "${:,.2f}"]
+
+
+def synthetic_prices(rows: int, distinct: int, seed: int = 0) -> pd.Series:
+    # listings repeat prices, rows are drawn from a pool of `distinct` price strings
+    rng = random.Random(seed)
+    pool = [rng.choice(PRICE_FORMATS).format(rng.uniform(1, 200_000)) for _ in range(distinct)]
+    prices = []
+    for _ in range(rows):
+        roll = rng.random()
+        if roll < 0.02:
+            prices.append(None)
+        elif roll < 0.03:
+            prices.append(rng.choice(["", "  ", "see price in cart"]))
+        else:
+            prices.append(rng.choice(pool))
+    return pd.Series(prices, dtype=object)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark clean_price (row by row) against clean_prices (vectorized)")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--distinct", type=int, default=50_000, help="number of distinct price strings")
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        prices = synthetic_prices(rows, distinct=min(args.distinct, rows))
+
+        start = time.perf_counter()
+        expected = prices.apply(clean_price)
+        row_by_row = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = clean_prices(prices)
+        vectorized = time.perf_counter() - start
+
+        if not expected.astype(float).equals(actual):
+            sys.exit(f"{rows} rows: clean_prices does not match clean_price")
+        print(f"{rows:>10} rows: apply {row_by_row:8.3f}s  vectorized {vectorized:8.3f}s  speedup x{row_by_row / vectorized:.1f}  (results match)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import results
+from stub_server import PAGE_PARAMETERS, StubSites, add_arguments, serve, stub_sites
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# page each scraper parses on its own: the product page, or the listing for flipkart
+PARSED_PAGES = {"ebay": "item", "flipkart": "listing", "reliancedigital": "item"}
+
+
+def scrape(site: str, base_url: str, category: str, max_pages: int):
+    # the real scrape_data of the site, pointed at the stub server
+    from scraping_scripts.headers import headers
+
+    if site == "ebay":
+        from scraping_scripts.ebayScraper import scrape_data
+        return scrape_data(f"{base_url}/ebay/sch/i.html?_nkw={category}&_pgn=1", dict(headers), category, max_pages, set())
+    if site == "flipkart":
+        from scraping_scripts.flipkartScraper import scrape_data
+        return scrape_data(f"{base_url}/flipkart/search?q={category}&page=1", dict(headers), category, max_pages, set())
+    from scraping_scripts.reliancedigitalScraper import scrape_data
+    return scrape_data(f"{base_url}/reliancedigital/{category}/c/S101210?searchQuery=:relevance&page=0", category, [], max_pages, set(),
+                       base_url=f"{base_url}/reliancedigital")
+
+
+def parse_ms(site: str, category: str, padding_kb: int, repeat: int = 20) -> float:
+    # time extract_data takes on one page, in the scraper process
+    from scraping_scripts.parse_pool import parse_page
+
+    sites = StubSites(padding_kb=padding_kb)
+    html = sites.render(site, PARSED_PAGES[site], "1")
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse_page(site, html, category)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run_site(args):
+    """Child process: scrapes one site from the stub server and prints its measures as json."""
+    sys.path.insert(0, ROOT_DIR)
+    from scraping_scripts.parse_pool import shutdown_parse_pool
+
+    start = time.perf_counter()
+    error = scrape(args.site, args.base_url, args.category, args.max_pages)
+    wall = time.perf_counter() - start
+    shutdown_parse_pool()  # the parser processes are counted in RUSAGE_CHILDREN once they exited
+
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    print(json.dumps({
+        "error": error,
+        "wall_s": wall,
+        "cpu_s": own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+        "peak_rss_mb": max(own.ru_maxrss, children.ru_maxrss) / 1024,  # ru_maxrss is in KB on linux
+        "parse_ms": parse_ms(args.site, args.category, args.padding_kb),
+    }))
+
+
+def child_environment(args, work_dir: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT_DIR,
+        "HTTP_CACHE": "0",  # every page comes from the stub server
+        "USE_PROXIES": "0",
+        "RATE_LIMIT_INITIAL": str(args.rate),
+        "RATE_LIMIT_MAX": str(args.rate),
+        "RETRY_DELAY": str(args.retry_delay),
+        "CRAWL_STATE_DB": os.path.join(work_dir, "cache", "crawl_state.db"),
+        "STORAGE_SINK": args.sink,
+    })
+    if args.parser_workers is not None:
+        env["PARSER_WORKERS"] = str(args.parser_workers)
+    return env
+
+
+def bench_site(args, sites: StubSites, site: str) -> dict:
+    with tempfile.TemporaryDirectory() as work_dir:
+        # the scrapers write data/ and logs/ in their working directory
+        os.makedirs(os.path.join(work_dir, "data"))
+        os.makedirs(os.path.join(work_dir, "logs"))
+        command = [sys.executable, os.path.abspath(__file__), "--child", site, "--base-url", sites.base_url,
+                   "--category", args.category, "--max-pages", str(args.max_pages), "--padding-kb", str(args.padding_kb)]
+        process = subprocess.run(command, cwd=work_dir, env=child_environment(args, work_dir), capture_output=True, text=True)
+        if process.returncode != 0:
+            raise RuntimeError(f"benchmark of {site} failed:\n{process.stderr}")
+        measures = json.loads(process.stdout.strip().splitlines()[-1])
+
+    served = sites.served(site)
+    pages = served["listing_pages"] + served["item_pages"]
+    return {
+        "pages": pages,
+        "pages_per_sec": pages / measures["wall_s"],
+        "parse_ms": measures["parse_ms"],
+        "cpu_s": measures["cpu_s"],
+        "peak_rss_mb": measures["peak_rss_mb"],
+        "errors": served["errors"],
+        "throttled": served["throttled"],
+        "failed": measures["error"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scrapers against a local stub of the sites")
+    parser.add_argument("--sites", nargs="+", choices=list(PAGE_PARAMETERS), default=list(PAGE_PARAMETERS))
+    parser.add_argument("--category", default="laptops")
+    parser.add_argument("--max-pages", type=int, default=3)
+    parser.add_argument("--rate", type=float, default=50, help="requests per second allowed by the rate limiter")
+    parser.add_argument("--retry-delay", type=float, default=0.05, help="base of the backoff between retries, in seconds")
+    parser.add_argument("--parser-workers", type=int, help="PARSER_WORKERS of the scrapers")
+    parser.add_argument("--sink", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--child", choices=list(PAGE_PARAMETERS), dest="site", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    add_arguments(parser)
+    results.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.site:
+        run_site(args)
+        return
+
+    sites = stub_sites(args)
+    server = serve(sites)
+    measured = {}
+    try:
+        for site in args.sites:
+            measured[site] = bench_site(args, sites, site)
+            m = measured[site]
+            print(f"{site:>16}: {m['pages']:5} pages {m['pages_per_sec']:8.1f} pages/s  parse {m['parse_ms']:7.2f} ms/page  "
+                  f"cpu {m['cpu_s']:6.2f}s  peak rss {m['peak_rss_mb']:7.1f} MB  "
+                  f"{m['errors']} errors, {m['throttled']} throttled{'  (stopped on an error)' if m['failed'] else ''}")
+    finally:
+        server.shutdown()
+
+    sys.exit(results.report(args, measured))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import json
+
+# metrics compared with the baseline, the other ones (page counts, errors) describe the run
+HIGHER_IS_BETTER = {"pages_per_sec"}
+LOWER_IS_BETTER = {"parse_ms", "cpu_s", "peak_rss_mb", "clean_s", "peak_mb"}
+
+
+def save_results(path: str, results: dict):
+    """Writes the results of a benchmark run, {case: {metric: value}}, to be used as a later baseline."""
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def regressions(results: dict, baseline_path: str, tolerance: float) -> list:
+    """Metrics more than `tolerance` (0.2 = 20%) worse than in the baseline run, as messages."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    found = []
+    for case, metrics in results.items():
+        for metric, value in metrics.items():
+            before = baseline.get(case, {}).get(metric)
+            if not before or metric not in HIGHER_IS_BETTER | LOWER_IS_BETTER:
+                continue
+            change = (before - value if metric in HIGHER_IS_BETTER else value - before) / before
+            if change > tolerance:
+                found.append(f"{case} {metric}: {before:.4g} -> {value:.4g} ({change:+.0%} worse)")
+    return found
+
+
+def add_arguments(parser):
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results of an earlier run, exit with an error if a metric regressed")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="regression allowed against the baseline (0.2 = 20%%)")
+
+
+def report(args, results: dict) -> int:
+    """Saves the results and compares them with the baseline, returns the exit code of the benchmark."""
+    if args.json:
+        save_results(args.json, results)
+    if not args.baseline:
+        return 0
+    found = regressions(results, args.baseline, args.tolerance)
+    for message in found:
+        print(f"regression: {message}")
+    return 1 if found else 0
@@ -0,0 +1,159 @@
+import argparse
+import os
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+
+# query parameter holding the page number of each site's listing urls
+PAGE_PARAMETERS = {"ebay": "_pgn", "flipkart": "page", "reliancedigital": "page"}
+
+# absolute links of the recorded pages, pointed at the stub server
+SITE_URLS = {"ebay": "https://www.ebay.com"}
+
+# listing page past the last page of a category
+EMPTY_LISTING = "<html><head><title>No results</title></head><body><p>No exact matches found</p></body></html>"
+
+# pages recorded on the sites are far bigger than the fixtures, mostly markup the scrapers never read
+PADDING_BLOCK = '<div class="filler"><span class="label">recommended</span><a href="#">similar item</a></div>\n'
+
+
+def load_page(name: str) -> str:
+    with open(os.path.join(PAGES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+class StubSites:
+    """Recorded listing and product pages of the scraped sites, served under /<site>/.
+
+    Listing pages are the urls carrying the site's page parameter, their links are numbered after
+    the page so every page leads to new products; any other url gets the product page. Each request
+    waits `latency` seconds (plus up to `jitter`), fails with a 500 with probability `error_rate`
+    and is throttled with a 429 with probability `throttle_rate`. Listing pages after `last_page` have
+    no products.
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 retry_after: float = 1, padding_kb: int = 200, last_page: int = None, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.last_page = last_page
+        self.padding = PADDING_BLOCK * (padding_kb * 1024 // len(PADDING_BLOCK))
+        self.base_url = None
+        self.counts = Counter()  # (site, listing or item, status) -> requests
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.pages = {site: {"listing": load_page(f"{site}_listing.html")} for site in PAGE_PARAMETERS}
+        for site in ("ebay", "reliancedigital"):
+            self.pages[site]["item"] = load_page(f"{site}_item.html")
+
+    def render(self, site: str, kind: str, page: str) -> str:
+        if kind == "listing" and self.last_page is not None and int(page) > self.last_page:
+            return EMPTY_LISTING
+        html = self.pages[site][kind].replace("{page}", page)
+        if site in SITE_URLS:
+            html = html.replace(SITE_URLS[site], f"{self.base_url}/{site}")
+        return html.replace("</body>", f"{self.padding}</body>")
+
+    def respond(self, path: str) -> tuple:
+        """(status, headers, body) of a request, and counts it."""
+        url = urlparse(path)
+        site = url.path.strip("/").split("/")[0]
+        if site not in self.pages:
+            return 404, {}, b"unknown site"
+
+        page = parse_qs(url.query).get(PAGE_PARAMETERS[site])
+        kind = "listing" if page else "item"
+        if kind not in self.pages[site]:
+            return 404, {}, b"no such page"
+
+        with self._lock:
+            draw = self._random.random()
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        time.sleep(delay)
+
+        if draw < self.throttle_rate:
+            status, headers, body = 429, {"Retry-After": str(self.retry_after)}, b"too many requests"
+        elif draw < self.throttle_rate + self.error_rate:
+            status, headers, body = 500, {}, b"internal error"
+        else:
+            status, headers, body = 200, {"Content-Type": "text/html; charset=utf-8"}, self.render(site, kind, page[0] if page else "").encode()
+        with self._lock:
+            self.counts[site, kind, status] += 1
+        return status, headers, body
+
+    def served(self, site: str) -> dict:
+        """Pages served to a site's scraper: listing and item pages, errors and throttled requests."""
+        with self._lock:
+            counts = {(kind, status): count for (name, kind, status), count in self.counts.items() if name == site}
+        return {
+            "listing_pages": counts.get(("listing", 200), 0),
+            "item_pages": counts.get(("item", 200), 0),
+            "errors": sum(count for (_, status), count in counts.items() if status == 500),
+            "throttled": sum(count for (_, status), count in counts.items() if status == 429),
+        }
+
+
+def serve(sites: StubSites, port: int = 0) -> ThreadingHTTPServer:
+    """Starts the stub server in a background thread, port 0 picks a free port."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, headers, body = sites.respond(self.path)
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    sites.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds each response waits")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many seconds added to the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After of the 429 responses, in seconds")
+    parser.add_argument("--last-page", type=int, help="listing pages after this one have no products")
+    parser.add_argument("--padding-kb", type=int, default=200, help="markup added to each page, to weigh like a real page")
+
+
+def stub_sites(args: argparse.Namespace) -> StubSites:
+    return StubSites(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                     retry_after=args.retry_after, padding_kb=args.padding_kb, last_page=args.last_page)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the recorded pages of the scraped sites locally")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    sites = stub_sites(args)
+    server = serve(sites, args.port)
+    print(f"serving {', '.join(f'{sites.base_url}/{site}/' for site in PAGE_PARAMETERS)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
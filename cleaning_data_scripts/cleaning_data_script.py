@@ -1,18 +1,45 @@
 import pandas as pd
+import numpy as np
+import argparse
+import json
 import re
 import os
+import sys
+import heapq
+import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
+
+# the script is run from the project root as a file, make the scraping_scripts package importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scraping_scripts.metrics import export, metrics, stage
+from scraping_scripts.price_store import PriceStore
+from scraping_scripts.product_index import PRODUCT_COLUMNS, product_ids
+from scraping_scripts.storage import CLEANED_DATA_DIR, cleaned_exists, read_cleaned, read_raw_chunks, read_raw_since, write_cleaned, write_products
+
+# watermarks of the raw data already cleaned, used by --incremental
+STATE_FILE = "cleaned_data/.cleaning_state.json"
+
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    STRING_DTYPE = object
+
+# Exchange rates to USD (update as needed), currencies are detected in this order
+EXCHANGE_RATES = {
+    "EUR": 1.04,  # 1 EUR = 1.04 USD
+    "GBP": 1.24,  # 1 GBP = 1.24 USD
+    "AU": 0.63,   # 1 AUD = 0.63 USD
+    "C": 0.74,    # 1 CAD = 0.74 USD
+    "₹": 0.01     # 1 INR = 0.01 USD
+}
+
 
 def clean_price(price):
     """ Remove currency symbols and convert various currencies to USD """
-    
-    # Exchange rates (update as needed)
-    EXCHANGE_RATES = {
-        "EUR": 1.04,  # 1 EUR = 1.04 USD
-        "GBP": 1.24,  # 1 GBP = 1.24 USD
-        "AU": 0.63,   # 1 AUD = 0.63 USD
-        "C": 0.74,    # 1 CAD = 0.74 USD
-        "₹": 0.01     # 1 INR = 0.01 USD
-    }
 
     if not isinstance(price, str) or not price.strip():
         return None  # Return None for missing or invalid values
@@ -34,121 +61,502 @@ def clean_price(price):
         return None  # Return None if conversion fails
 
 
+def clean_prices(prices: pd.Series) -> pd.Series:
+    """ Column-wide clean_price: same results, computed with vectorized string operations """
+    if prices.dtype != object:
+        return pd.Series(float("nan"), index=prices.index)  # no strings, nothing to convert
+
+    # Listings share a lot of prices, convert each distinct price once (missing prices get code -1)
+    codes, uniques = pd.factorize(prices)
+    uniques = pd.Series(uniques, dtype=object)
+
+    # Non string values are invalid prices, arrow backed strings run the string operations in C
+    uniques = uniques.where(uniques.map(type) == str).astype(STRING_DTYPE)
+
+    # Detect currency, the first currency of EXCHANGE_RATES found in the price wins
+    coefficient = pd.Series(1.0, index=uniques.index)
+    undetected = pd.Series(True, index=uniques.index)
+    for currency, rate in EXCHANGE_RATES.items():
+        found = undetected & uniques.str.contains(currency, regex=False, na=False).astype(bool)
+        coefficient[found] = rate
+        undetected &= ~found
+
+    # Remove non-numeric characters (except . and , for decimals)
+    cleaned_prices = uniques.str.replace(r"[^\d.,]", "", regex=True).str.replace(",", "", regex=False)
+    values = pd.to_numeric(cleaned_prices, errors="coerce").astype("float64") * coefficient
+
+    # numpy rounds value * 100, which can land on the other side of a half cent than python's round:
+    # let python round the few values that are (almost) half way between two cents
+    rounded = values.round(2)
+    near_half = ((values * 100) % 1 - 0.5).abs() < 1e-6
+    rounded[near_half] = values[near_half].map(lambda value: round(value, 2))
+
+    # Map the distinct prices back to the rows, code -1 picks the trailing NaN
+    return pd.Series(np.append(rounded.to_numpy(), np.nan)[codes], index=prices.index)
+
+
+# Patterns of the processor and model normalizers, compiled once
+PARENTHESES_PATTERN = re.compile(r"\(.*?\)")
+PROCESSOR_DETAILS_PATTERN = re.compile(r"\b(up to|GHz|Turbo Frequency|Base Frequency|Cache|Threads|Cores|TOPs|AI)\b", flags=re.IGNORECASE)
+PROCESSOR_WORDS_PATTERN = re.compile(r"\b(Processor|Mobile Processor|CPU)\b", flags=re.IGNORECASE)
+SPACES_PATTERN = re.compile(r"\s+")
+LEADING_NUMBER_PATTERN = re.compile(r"^\d+.\d+")
+
+# A product is listed once per day, at its minimum price
+DEDUP_KEYS = ["brand", "model", "processor", "ram", "storage", "scraping_date"]
+
+# Sorted runs merged at a time by --chunksize, one piece of `chunksize // MERGE_FAN_IN` rows of each is in memory
+MERGE_FAN_IN = 64
+
+# Low cardinality columns of the cleaned data, stored as categories
+CATEGORICAL_COLUMNS = ["website", "category", "brand", "promotion", "ram", "storage"]
+
+# Distinct strings normalized in this run, shared by every category and source
+NORMALIZER_CACHE_SIZE = 100_000
+
+
+@lru_cache(maxsize=NORMALIZER_CACHE_SIZE)
+def normalize_model(brand: str, model: str) -> str:
+    """Remove brand name from model if it appears at the start."""
+    brand = brand.strip().lower()
+    model = model.split(",")[0]
+    model = model.replace("(2024) with Touch screen", "").strip()
+
+    # Remove brand if it appears at the start of the model
+    if model.lower().startswith(brand):
+        model = model[len(brand):].strip()
+
+    return model
+
+
 def clean_model(row):
     """Remove brand name from model if it appears at the start."""
     brand, model = row["brand"], row["model"]
-    
+
     if isinstance(brand, str) and isinstance(model, str):
-        brand = brand.strip().lower()
-        model = model.split(",")[0]
-        "".join(model)
-        model = model.replace("(2024) with Touch screen", "").strip()
-        
-        
-        # Remove brand if it appears at the start of the model
-        if model.lower().startswith(brand):
-            model = model[len(brand):].strip()
-    
+        model = normalize_model(brand, model)
+
     return model
 
 
-def clean_processor(processor):
+@lru_cache(maxsize=NORMALIZER_CACHE_SIZE)
+def normalize_processor(processor: str) -> str:
     """Extracts and standardizes the processor name, removing extra details."""
-    if not isinstance(processor, str):
-        return None  # Handle missing values gracefully
-
     # Remove cache, frequency details, AI terms, and redundant words
-    processor = re.sub(r"\(.*?\)", "", processor)  # Remove anything inside parentheses
-    processor = re.sub(r"\b(up to|GHz|Turbo Frequency|Base Frequency|Cache|Threads|Cores|TOPs|AI)\b", "", processor, flags=re.IGNORECASE)
-    
+    processor = PARENTHESES_PATTERN.sub("", processor)  # Remove anything inside parentheses
+    processor = PROCESSOR_DETAILS_PATTERN.sub("", processor)
+
     # Remove surrounding quotes if present
     processor = processor.strip(".").replace(":","").strip('"').strip()
 
     processor = processor.split(",")
     processor = processor[0] if len(processor) == 1 or len(processor[0]) > len(processor[1]) else processor[1]
-    "".join(processor)
 
     # Remove "Processor", "Mobile Processor", "CPU", etc.
-    processor = re.sub(r"\b(Processor|Mobile Processor|CPU)\b", "", processor, flags=re.IGNORECASE)
+    processor = PROCESSOR_WORDS_PATTERN.sub("", processor)
 
-    processor = re.sub(r"\s+", " ", processor).strip()
-    processor = re.sub(r"^\d+.\d+", " ", processor).strip()
+    processor = SPACES_PATTERN.sub(" ", processor).strip()
+    processor = LEADING_NUMBER_PATTERN.sub(" ", processor).strip()
 
     return processor
 
 
-def clean_data(df: pd.DataFrame):
-    # Make a full copy to avoid SettingWithCopyWarning
-    df = df.copy()
+def clean_processor(processor):
+    """Extracts and standardizes the processor name, removing extra details."""
+    if not isinstance(processor, str):
+        return None  # Handle missing values gracefully
+    return normalize_processor(processor)
+
+
+def clean_processors(processors: pd.Series) -> pd.Series:
+    """ clean_processor on the distinct processors only, mapped back to the rows """
+    codes, uniques = pd.factorize(processors)
+    # code -1 (missing processor) picks the trailing None
+    cleaned = np.array([clean_processor(processor) for processor in uniques] + [None], dtype=object)
+    return pd.Series(cleaned[codes], index=processors.index)
 
-    # Clean RAM and storage by removing 'Up to' and 'GB'
-    df["ram"] = df["ram"].str.replace(r"Up to|\s?GB", "", regex=True).str.strip()
-    df["storage"] = df["storage"].str.replace(r"Up to|\s?GB", "", regex=True).str.strip()
 
-    # Convert RAM and storage to numeric
-    df["ram"] = pd.to_numeric(df["ram"], errors="coerce")
-    df["storage"] = pd.to_numeric(df["storage"], errors="coerce")
+def clean_models(brands: pd.Series, models: pd.Series) -> pd.Series:
+    """ clean_model on the distinct (brand, model) pairs only, mapped back to the rows """
+    brand_codes, brand_uniques = pd.factorize(brands, use_na_sentinel=False)
+    model_codes, model_uniques = pd.factorize(models, use_na_sentinel=False)
+    pair_codes, pairs = pd.factorize(brand_codes.astype("int64") * len(model_uniques) + model_codes)
 
-    # Fill missing RAM and storage with mode (most common value)
-    df["ram"] = df["ram"].fillna(df["ram"].mode().iloc[0])
-    df["storage"] = df["storage"].fillna(df["storage"].mode().iloc[0])
+    cleaned = np.empty(len(pairs), dtype=object)
+    for i, pair in enumerate(pairs):
+        brand, model = brand_uniques[pair // len(model_uniques)], model_uniques[pair % len(model_uniques)]
+        cleaned[i] = normalize_model(brand, model) if isinstance(brand, str) and isinstance(model, str) else model
+    return pd.Series(cleaned[pair_codes], index=models.index)
 
-    # Convert back to 'XX GB' format
-    df["ram"] = df["ram"].astype(int).astype(str) + " GB"
-    df["storage"] = df["storage"].astype(int).astype(str) + " GB"
 
-    df["price"] = df["price"].apply(clean_price)
-    df["model"] = df.apply(clean_model, axis=1)
+def parse_capacity(capacity: pd.Series) -> pd.Series:
+    """ Remove 'Up to' and 'GB' from RAM or storage and convert it to numeric """
+    return pd.to_numeric(capacity.str.replace(r"Up to|\s?GB", "", regex=True).str.strip(), errors="coerce")
 
-    df["processor"] = df["processor"].apply(clean_processor)
 
-    # Convert all string columns to lowercase
-    df = df.map(lambda x: x.lower() if isinstance(x, str) else x)
+def most_common(counts: pd.Series):
+    """ Same value as Series.mode().iloc[0], from value counts: the most frequent value, the smallest on ties """
+    return counts[counts == counts.max()].index.min()
 
-    # Drop rows where brand, model, or price is missing
-    df["model"] = df["model"].astype(str).fillna("")
-    df = df.dropna(subset=["brand", "model", "price"])
 
+def dedup_min_price(df: pd.DataFrame):
     # Remove exact duplicate rows
     df = df.drop_duplicates()
 
     # If duplicates exist with different prices, keep the one with the minimum price
-    df = df.loc[df.groupby(["brand", "model", "processor", "ram", "storage", "scraping_date"])["price"].idxmin()]
+    # (observed=True: only the combinations present in the data when some keys are categorical)
+    df = df.loc[df.groupby(DEDUP_KEYS, observed=True)["price"].idxmin()]
 
     return df
 
 
-def main():
+def categorical(values: pd.Index, codes: np.ndarray) -> pd.Series:
+    """ Categorical of values[codes] (-1 is missing), categories sorted like the strings they replace """
+    categories = pd.Index(values.unique()).sort_values()
+    # code -1 picks the trailing -1, also when every value is missing and there are no categories
+    return pd.Categorical.from_codes(np.append(categories.get_indexer(values), -1)[codes], categories)
+
+
+def lowercase(column: pd.Series, as_category: bool = False) -> pd.Series:
+    """ Lowercase the strings of a column once per distinct value, other values are left as they are """
+    codes, uniques = pd.factorize(column)
+    lowered = pd.Index([value.lower() if isinstance(value, str) else value for value in uniques], dtype=object)
+    if as_category:
+        return pd.Series(categorical(lowered, codes), index=column.index, name=column.name)
+    # code -1 (missing value) picks the trailing NaN
+    return pd.Series(np.append(lowered.to_numpy(), np.nan)[codes], index=column.index, name=column.name)
+
+
+def capacity_labels(capacity: pd.Series) -> pd.Series:
+    """ 'XX gb' labels of RAM or storage sizes, as a categorical formatted once per distinct size """
+    codes, uniques = pd.factorize(capacity.astype(int))
+    labels = pd.Index([f"{size} gb" for size in uniques], dtype=object)
+    return pd.Series(categorical(labels, codes), index=capacity.index, name=capacity.name)
+
+
+def clean_data(df: pd.DataFrame, fill_values: dict = None):
+    # Shallow copy: every cleaned column is replaced, never modified in place, so the caller's frame is left as is
+    df = df.copy(deep=False)
+    metrics.count("clean_input_rows_total", len(df))
+
+    with stage("clean", step="capacities"):
+        # Clean RAM and storage by removing 'Up to' and 'GB' and convert them to numeric
+        df["ram"] = parse_capacity(df["ram"])
+        df["storage"] = parse_capacity(df["storage"])
+
+        # Fill missing RAM and storage with mode (most common value), or with the given values
+        if fill_values is None:
+            fill_values = {"ram": df["ram"].mode().iloc[0], "storage": df["storage"].mode().iloc[0]}
+
+        # Convert back to lowercase 'XX gb' format
+        df["ram"] = capacity_labels(df["ram"].fillna(fill_values["ram"]))
+        df["storage"] = capacity_labels(df["storage"].fillna(fill_values["storage"]))
+
+    with stage("clean", step="prices"):
+        df["price"] = clean_prices(df["price"])
+    with stage("clean", step="models"):
+        df["model"] = clean_models(df["brand"], df["model"])
+    with stage("clean", step="processors"):
+        df["processor"] = clean_processors(df["processor"])
+
+    with stage("clean", step="lowercase"):
+        # Convert the string columns to lowercase, low cardinality ones are stored as categories
+        for column in df.columns[df.dtypes == object]:
+            df[column] = lowercase(df[column], as_category=column in CATEGORICAL_COLUMNS)
+
+    with stage("clean", step="dedup"):
+        # Drop rows where brand, model, or price is missing
+        df["model"] = df["model"].astype(str)
+        df = df.dropna(subset=["brand", "model", "price"])
+        df = dedup_min_price(df)
+    metrics.count("clean_output_rows_total", len(df))
+    return df
+
+
+def merge_cleaned(existing: pd.DataFrame, new: pd.DataFrame):
+    """ Merge newly cleaned rows into the previously cleaned rows of the same source, keeping the minimum prices """
+    return dedup_min_price(pd.concat([existing, new], ignore_index=True))
+
+
+def load_state(path: str) -> dict:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
 
-    data_files = {
-        "smartphones": [
-            "ebay_smartphones.csv",
-            "flipkart_smartphones.csv",
-            "reliancedigital_smartphones.csv"
-        ],
-        "laptops": [
-            "ebay_laptops.csv",
-            "flipkart_laptops.csv",
-            "reliancedigital_laptops.csv"
-        ],
-        "tablets": [
-            "ebay_tablets.csv",
-            "flipkart_tablets.csv",
-            "reliancedigital_tablets.csv"
-        ]
+def save_state(path: str, state: dict):
+    # write to a temporary file first so an interrupted run never leaves a truncated state
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def update_counts(counts: dict, values: pd.Series) -> dict:
+    # running value counts of RAM / storage, so the mode covers every row ever scraped from the source
+    total = pd.Series({float(value): count for value, count in counts.items()}, dtype="int64")
+    total = total.add(values.value_counts(), fill_value=0).astype("int64")
+    return {str(value): int(count) for value, count in total.items()}
+
+
+def source_counts(df: pd.DataFrame, source_state: dict = None) -> dict:
+    # running RAM / storage value counts of a source, with the rows of df added
+    source_state = source_state or {}
+    return {
+        "ram_counts": update_counts(source_state.get("ram_counts", {}), parse_capacity(df["ram"])),
+        "storage_counts": update_counts(source_state.get("storage_counts", {}), parse_capacity(df["storage"])),
+    }
+
+
+def counts_fill_values(counts: dict) -> dict:
+    """ RAM / storage fill values of a source, the most common values of its running counts """
+    return {
+        "ram": most_common(pd.Series(counts["ram_counts"], dtype="int64").rename(index=float)),
+        "storage": most_common(pd.Series(counts["storage_counts"], dtype="int64").rename(index=float)),
+    }
+
+
+def same_fill_values(a: dict, b: dict) -> bool:
+    return all(a[column] == b[column] or (pd.isna(a[column]) and pd.isna(b[column])) for column in ("ram", "storage"))
+
+
+def clean_source(site: str, category: str, source_state: dict):
+    """ Clean the rows scraped from a source since its watermark, returns them with the updated source state,
+    whether they replace every row cleaned before (instead of being merged into them) and the metrics recorded
+    while cleaning them """
+    with stage("read_raw", site=site):
+        df, watermark = read_raw_since(site, category, source_state.get("watermark"))
+    counts = source_counts(df, source_state)
+    fill_values = counts_fill_values(counts)
+
+    replaced = False
+    if "watermark" in source_state and not df.empty and not same_fill_values(counts_fill_values(source_state), fill_values):
+        # the new rows changed the most common RAM or storage: the rows cleaned by the previous runs were filled
+        # with the old values, clean the whole source again so the output is the same as a full run's
+        with stage("read_raw", site=site):
+            df, watermark = read_raw_since(site, category)
+        counts = source_counts(df)
+        fill_values = counts_fill_values(counts)
+        replaced = True
+
+    source_state = {"watermark": watermark, **counts}
+    if df.empty:
+        return None, source_state, replaced, metrics.collect()
+    return clean_data(df, fill_values=fill_values), source_state, replaced, metrics.collect()
+
+
+def append_piece(path: str, df: pd.DataFrame):
+    with open(path, "ab") as f:
+        pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_pieces(path: str):
+    """ Frames appended to a temporary file by append_piece, one at a time """
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def run_rows(path: str):
+    for piece in read_pieces(path):
+        yield from piece.itertuples(index=False, name=None)
+
+
+def row_frames(rows, columns: pd.Index, size: int):
+    """ Rows of the cleaned data merged back into frames of `size` rows """
+    while True:
+        frame_rows = [row for _, row in zip(range(size), rows)]
+        if not frame_rows:
+            return
+        df = pd.DataFrame(frame_rows, columns=columns, dtype=object)
+        df["price"] = df["price"].astype(float)
+        yield df
+
+
+def source_fill_values(site: str, category: str, chunksize: int):
+    """ First pass over a source: RAM / storage fill values and number of rows, reading only these two columns """
+    counts, rows = {"ram_counts": {}, "storage_counts": {}}, 0
+    for chunk in read_raw_chunks(site, category, chunksize, columns=["ram", "storage"]):
+        counts = source_counts(chunk, counts)
+        rows += len(chunk)
+    return counts_fill_values(counts), rows
+
+
+def clean_source_chunked(site: str, category: str, chunksize: int, tmp_dir: str):
+    """ Clean a source with at most `chunksize` raw rows in memory, yields the cleaned rows in frames.
+
+    Cleaned chunks are spread over hash buckets of the dedup keys, so every product of a day lands in
+    the same bucket. Each bucket is deduped on its own and saved as a run sorted by the keys, then the
+    runs are merged back in key order: the rows come out in the same order as clean_data's.
+    """
+    fill_values, rows = source_fill_values(site, category, chunksize)
+    buckets = max(1, -(-rows // chunksize))  # about `chunksize` rows per bucket
+    bucket_paths = [os.path.join(tmp_dir, f"{site}_{category}_bucket_{i}.pkl") for i in range(buckets)]
+
+    columns = None
+    for chunk in read_raw_chunks(site, category, chunksize):
+        cleaned = clean_data(chunk, fill_values=fill_values)
+        columns = cleaned.columns
+        bucket_of = pd.util.hash_pandas_object(cleaned[DEDUP_KEYS].astype(str), index=False).to_numpy() % buckets
+        for bucket, part in cleaned.groupby(bucket_of):
+            append_piece(bucket_paths[bucket], part)
+
+    piece_rows = max(1, chunksize // MERGE_FAN_IN)
+    run_paths = []
+    for bucket_path in bucket_paths:
+        if not os.path.exists(bucket_path):
+            continue
+        run = dedup_min_price(pd.concat(read_pieces(bucket_path), ignore_index=True))
+        os.remove(bucket_path)
+        run_path = bucket_path.replace("_bucket_", "_run_")
+        for start in range(0, len(run), piece_rows):
+            append_piece(run_path, run.iloc[start:start + piece_rows])
+        run_paths.append(run_path)
+
+    keys = itemgetter(*[columns.get_loc(key) for key in DEDUP_KEYS]) if columns is not None else None
+
+    # runs are merged MERGE_FAN_IN at a time into longer runs until the last pass, which yields the rows:
+    # at most MERGE_FAN_IN files are open and `chunksize` rows of the runs are in memory at a time
+    merge_pass = 0
+    while len(run_paths) > MERGE_FAN_IN:
+        merged_paths = []
+        for start in range(0, len(run_paths), MERGE_FAN_IN):
+            group = run_paths[start:start + MERGE_FAN_IN]
+            merged_path = os.path.join(tmp_dir, f"{site}_{category}_merge_{merge_pass}_{len(merged_paths)}.pkl")
+            merged = heapq.merge(*[run_rows(path) for path in group], key=keys)
+            for piece in row_frames(merged, columns, piece_rows):
+                append_piece(merged_path, piece)
+            for path in group:
+                os.remove(path)
+            merged_paths.append(merged_path)
+        run_paths = merged_paths
+        merge_pass += 1
+
+    merged = heapq.merge(*[run_rows(path) for path in run_paths], key=keys)
+    yield from row_frames(merged, columns, chunksize)
+
+    for run_path in run_paths:
+        os.remove(run_path)
+
+
+def stored(frames, store: PriceStore, category: str):
+    """ Upserts the cleaned frames into the price store on their way to the cleaned file """
+    for df in frames:
+        with stage("store"):
+            store.upsert(category, df)
+        yield df
+
+
+def link_products(store: PriceStore, category: str):
+    """ Link the same device across the sites, over the whole history of the category, and refresh its aggregates """
+    with stage("product_ids"):
+        products = product_ids(read_cleaned(category, columns=PRODUCT_COLUMNS))
+        write_products(category, products)
+    with stage("store"):
+        store.set_product_ids(category, products)
+        store.refresh_aggregates(category)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean the scraped data")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--incremental", action="store_true", help="only clean the rows scraped since the last run and merge them into the cleaned data")
+    mode.add_argument("--chunksize", type=int, help="stream the raw data, with at most this many rows in memory, for data larger than RAM")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of processes cleaning the sources in parallel, 1 cleans them one by one (not used with --chunksize)")
+    args = parser.parse_args()
+
+    data_sources = {
+        "smartphones": ["ebay", "flipkart", "reliancedigital"],
+        "laptops": ["ebay", "flipkart", "reliancedigital"],
+        "tablets": ["ebay", "flipkart", "reliancedigital"],
     }
 
     # Create cleaned_data directory if it doesn’t exist
     os.makedirs("cleaned_data", exist_ok=True)
 
-    for category, file_list in data_files.items():
-        header = True
-        for file in file_list:
-            df = pd.read_csv(f"data/{file}")
-            df = clean_data(df)    
-            df.to_csv(f"cleaned_data/{category}.csv", index=False, header=header, mode=("w" if header else "a"))  # Save cleaned file
-            header = False
-        print(f"Saved cleaned file: cleaned_data/{category}.csv")
+    # daily prices of every category, for the analysis queries
+    store = PriceStore()
+
+    if args.chunksize:
+        for category, sites in data_sources.items():
+            store.clear(category)
+            with tempfile.TemporaryDirectory(dir=CLEANED_DATA_DIR) as tmp_dir:
+                frames = (df for site in sites for df in clean_source_chunked(site, category, args.chunksize, tmp_dir))
+                write_cleaned(category, stored(frames, store, category))
+            link_products(store, category)
+            print(f"Saved cleaned file: cleaned_data/{category}")
+        store.close()
+        print(f"metrics saved to {export('cleaning')}")
+        return
+
+    # watermark and RAM / storage counts of every source, from the previous runs
+    state = load_state(STATE_FILE) if args.incremental else {}
+
+    incremental = {category: args.incremental and cleaned_exists(category) for category in data_sources}
+    for category, sites in data_sources.items():
+        if not incremental[category]:
+            # nothing to merge into, clean every source from the start
+            for site in sites:
+                state.pop(f"{site}_{category}", None)
+
+    # every source is cleaned on its own, the results come back in the order of data_sources
+    sources = [(site, category) for category, sites in data_sources.items() for site in sites]
+    arguments = ([site for site, _ in sources], [category for _, category in sources], [state.get(f"{site}_{category}", {}) for site, category in sources])
+    pool = ProcessPoolExecutor(max_workers=min(args.workers, len(sources))) if args.workers > 1 else None
+    results = pool.map(clean_source, *arguments) if pool else map(clean_source, *arguments)
+
+    try:
+        for category, sites in data_sources.items():
+            existing = read_cleaned(category) if incremental[category] else None
+            store_rebuilt = False
+            if existing is not None:
+                # missing models were saved as the "nan" string, which read_csv reads back as NaN
+                existing["model"] = existing["model"].astype(str)
+            cleaned_sources = {}
+            for site in sites:
+                cleaned_sources[site], state[f"{site}_{category}"], replaced, recorded = next(results)
+                metrics.merge(recorded)
+                if replaced and existing is not None:
+                    # the source was cleaned again from the start, its previous rows are dropped
+                    existing = existing[existing["website"] != site]
+                    store_rebuilt = True
+
+            # the new rows are enough to update the store, unless it does not hold the category yet
+            # or a source was cleaned again from the start
+            store_new_rows = existing is not None and store.has(category) and not store_rebuilt
+
+            cleaned = []
+            for site, df in cleaned_sources.items():
+                if store_new_rows and df is not None:
+                    with stage("store"):
+                        store.upsert(category, df)
+                previous = existing[existing["website"] == site] if existing is not None else None
+                if previous is None or previous.empty:
+                    cleaned.append(df)
+                elif df is None:
+                    cleaned.append(previous)
+                else:
+                    cleaned.append(merge_cleaned(previous, df))
+
+            cleaned = [df for df in cleaned if df is not None]
+            if not store_new_rows:
+                store.clear(category)
+                cleaned = list(stored(cleaned, store, category))
+            with stage("write_cleaned"):
+                write_cleaned(category, cleaned)  # Save cleaned file
+
+            link_products(store, category)
+            save_state(STATE_FILE, state)
+            print(f"Saved cleaned file: cleaned_data/{category}")
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        store.close()
+    print(f"metrics saved to {export('cleaning')}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import seaborn as sns
+import matplotlib.pyplot as plt
+
+# Charts of the price analysis, drawn from the daily aggregates of the price store
+# (scraping_scripts/price_store.py) instead of every cleaned row, so they stay fast as history grows.
+
+
+def plot_histogram(store, category: str, bins: int = 30):
+    # Histogram → Shows price distributions across platforms.
+    histogram = store.histogram(category)
+    plt.figure(figsize=(10, 5))
+    sns.histplot(data=histogram, x="price", weights="listings", hue="website", bins=bins, kde=True)
+    plt.title(f"Price Distribution of {category} Across Platforms")
+    plt.suptitle(f"{category} Price Analysis Across Platforms", fontsize=14)
+    plt.xlabel("Price (in USD)")
+    plt.ylabel("Frequency")
+    plt.show()
+
+
+def plot_averages(store, category: str):
+    # Bar Chart → Highlights average price differences, with the 95% confidence interval of the mean.
+    summary = store.site_summary(category)
+    plt.figure(figsize=(8, 5))
+    plt.bar(summary.index, summary["mean"], yerr=1.96 * summary["std"] / np.sqrt(summary["count"]),
+            color=sns.color_palette(n_colors=len(summary)), capsize=4)
+    plt.title(f"Average {category} Prices Across Platforms")
+    plt.suptitle(f"{category} Price Analysis Across Platforms", fontsize=14)
+    plt.xlabel("website")
+    plt.ylabel("Average Price")
+    plt.show()
+
+
+def plot_trends(store, category: str):
+    # Line Chart → Tracks price trends over time, the band is the 95% confidence interval of the daily mean.
+    daily = store.daily_stats(category)
+    daily["scraping_date"] = pd.to_datetime(daily["scraping_date"])
+    margin = 1.96 * daily["std_price"].fillna(0) / np.sqrt(daily["listings"])
+    plt.figure(figsize=(10, 5))
+    ax = sns.lineplot(data=daily, x="scraping_date", y="mean_price", hue="website")
+    for (website, days), color in zip(daily.groupby("website"), sns.color_palette()):
+        ax.fill_between(days["scraping_date"], days["mean_price"] - margin[days.index], days["mean_price"] + margin[days.index], color=color, alpha=0.2)
+    plt.title(f"Price Trends of {category} Over Time")
+    plt.suptitle(f"{category} Price Analysis Across Platforms", fontsize=14)
+    plt.xlabel("Date")
+    plt.ylabel("Price")
+    plt.xticks(rotation=45)
+    plt.show()
+
+
+def show_stats(store, category: str):
+    print(f"{category} descripton: ")
+    print(store.site_summary(category))
+
+    plot_histogram(store, category)
+    plot_averages(store, category)
+    plot_trends(store, category)
@@ -1,9 +1,11 @@
 import os
-import threading
 from datetime import datetime
-from scraping_scripts.ebayScraper import main as ebay_main
-from scraping_scripts.reliancedigitalScraper import main as reliancedigital_main
-from scraping_scripts.flipkartScraper import main as flipkart_main
+from scraping_scripts import ebayScraper, flipkartScraper, reliancedigitalScraper
+from scraping_scripts.reliancedigitalScraper import driver_pool
+from scraping_scripts.utils import get_crawl_frontier, log_errors, session_pool
+from scraping_scripts.parse_pool import shutdown_parse_pool
+from scraping_scripts.metrics import export, start_metrics_server
+from scraping_scripts.scheduler import scrape_all
 
 if __name__ == "__main__":
     start = datetime.now()
@@ -17,24 +19,22 @@ if __name__ == "__main__":
     if not os.path.exists("./logs"):
         os.mkdir("./logs")
 
-    scraper_threads = [
-        threading.Thread(target=flipkart_main),
-        threading.Thread(target=ebay_main),
-        threading.Thread(target=reliancedigital_main),
-    ]
+    # the pages of every site share the scheduler's workers, the errors of each site still go to its own log
+    for site in ("flipkart", "ebay", "reliancedigital"):
+        log_errors(site)
 
-    for thread in scraper_threads:
-        try:
-            thread.start()
-        except Exception as e:
-            print(f"Error starting thread {thread.name}: {e}")
+    # prometheus endpoint of the running scrapers, when METRICS_PORT is set
+    start_metrics_server()
 
-    for thread in scraper_threads:
-        try:
-            thread.join()
-        except Exception as e:
-            print(f"Error joining thread {thread.name}: {e}")
+    # every category of every site, its pages are scheduled one at a time (SCHEDULER_WORKERS, SCHEDULER_SITE_LIMITS)
+    crawls = flipkartScraper.page_crawls() + ebayScraper.page_crawls() + reliancedigitalScraper.page_crawls()
+    scrape_all(crawls, get_crawl_frontier())
+
+    session_pool.close()
+    shutdown_parse_pool()
+    driver_pool.close()
 
     print("All scraping threads have finished.")
+    print(f"metrics saved to {export('scraper')}")
     print("\ntotal time it took:")
     print(datetime.now() - start)
@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import threading
+import time
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+# a url that failed this many times is left out until the crawl of its category is finished
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    site TEXT NOT NULL,
+    category TEXT NOT NULL,
+    url TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (site, category, url)
+);
+CREATE INDEX IF NOT EXISTS urls_by_state ON urls (site, category, state);
+"""
+
+
+class CrawlFrontier:
+    """Crawl state of the pages of every site and category, shared by the scrapers.
+
+    Each url goes pending -> in_flight -> done or failed, every change is committed right away to an
+    sqlite database in WAL mode, so a crawl interrupted at any point resumes exactly where it stopped:
+    urls that were in flight are pending again, done urls are skipped. Membership is checked in the
+    database, the history of the crawl is never loaded in memory.
+    """
+
+    def __init__(self, path: str = "cache/crawl_state.db", max_attempts: int = MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")  # a crashed scraper loses no commit, a power cut at most the last ones
+        self._connection.executescript(SCHEMA)
+
+    def recover(self, site: str):
+        """Puts back the urls left in flight by an interrupted run of the site's scraper."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE urls SET state = ?, updated_at = ? WHERE site = ? AND state = ?", (PENDING, time.time(), site, IN_FLIGHT)
+            )
+
+    def add(self, site: str, category: str, urls: list) -> list:
+        """Adds the urls found on a page, returns the ones still to scrape (not done, not failed too often), in order."""
+        urls = list(dict.fromkeys(urls))
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO urls (site, category, url, updated_at) VALUES (?, ?, ?, ?)",
+                [(site, category, url, now) for url in urls],
+            )
+            return [
+                url for url in urls
+                if self._connection.execute(
+                    "SELECT 1 FROM urls WHERE site = ? AND category = ? AND url = ? AND state != ? AND attempts < ?",
+                    (site, category, url, DONE, self.max_attempts),
+                ).fetchone()
+            ]
+
+    def start(self, site: str, category: str, urls: list):
+        self._set(site, category, urls, IN_FLIGHT, "attempts = attempts + 1")
+
+    def done(self, site: str, category: str, urls: list):
+        self._set(site, category, urls, DONE)
+
+    def fail(self, site: str, category: str, url: str, error: Exception):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE urls SET state = ?, error = ?, updated_at = ? WHERE site = ? AND category = ? AND url = ?",
+                (FAILED, str(error), time.time(), site, category, url),
+            )
+
+    def discard(self, site: str, category: str, urls: list):
+        """Forgets urls that turned out not to be part of the crawl, e.g. listing pages after the last one."""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "DELETE FROM urls WHERE site = ? AND category = ? AND url = ?", [(site, category, url) for url in urls]
+            )
+
+    def _set(self, site: str, category: str, urls: list, state: str, extra: str = None):
+        assignments = "state = ?, updated_at = ?" + (f", {extra}" if extra else "")
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                f"UPDATE urls SET {assignments} WHERE site = ? AND category = ? AND url = ?",
+                [(state, now, site, category, url) for url in urls],
+            )
+
+    def counts(self, site: str, category: str) -> dict:
+        """Number of urls in each state."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT state, COUNT(*) FROM urls WHERE site = ? AND category = ? GROUP BY state", (site, category)
+            ).fetchall()
+        return dict(rows)
+
+    def finish(self, site: str, category: str):
+        """Forgets the crawl of a category once it completed, the next run starts from the first page."""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM urls WHERE site = ? AND category = ?", (site, category))
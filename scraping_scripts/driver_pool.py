@@ -0,0 +1,108 @@
+import threading
+from contextlib import contextmanager
+import psutil
+
+
+class DriverPool:
+    """Bounded pool of warm Selenium drivers shared by the scraping threads.
+
+    Drivers are created on demand up to `max_size`, health checked when borrowed and
+    recycled after `max_pages` pages or once their browser uses more than `max_memory_mb`.
+    """
+
+    def __init__(self, factory, max_size: int = 2, max_pages: int = 50, max_memory_mb: float = 1024):
+        self.factory = factory
+        self.max_size = max_size
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self._idle = []
+        self._pages = {}  # id(driver) -> pages loaded by the driver
+        self._size = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: float = None) -> object:
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._idle or self._size < self.max_size, timeout=timeout):
+                raise TimeoutError("no selenium driver available")
+            if self._idle:
+                driver = self._idle.pop()
+            else:
+                driver = None
+                self._size += 1
+
+        if driver is not None and not self.is_healthy(driver):
+            # replace the dead driver, keeping its slot in the pool
+            self._quit(driver)
+            driver = None
+
+        if driver is None:
+            try:
+                driver = self.factory()
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+                raise
+            with self._condition:
+                self._pages[id(driver)] = 0
+        return driver
+
+    def release(self, driver: object, pages: int = 1):
+        # the page counts are shared by every thread releasing a driver, the memory is measured outside the lock
+        with self._condition:
+            self._pages[id(driver)] = loaded = self._pages.get(id(driver), 0) + pages
+        if loaded >= self.max_pages or memory_mb(driver) > self.max_memory_mb:
+            self._discard(driver)
+            return
+        with self._condition:
+            self._idle.append(driver)
+            self._condition.notify()
+
+    @contextmanager
+    def driver(self, timeout: float = None):
+        driver = self.acquire(timeout=timeout)
+        try:
+            yield driver
+        except Exception:
+            # the driver may be left in a broken state, do not hand it to another page
+            self._discard(driver)
+            raise
+        else:
+            self.release(driver)
+
+    def is_healthy(self, driver: object) -> bool:
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _quit(self, driver: object):
+        with self._condition:
+            self._pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _discard(self, driver: object):
+        self._quit(driver)
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for driver in idle:
+            self._discard(driver)
+
+
+def memory_mb(driver: object) -> float:
+    # resident memory of the chromedriver process and the browser processes it started
+    try:
+        process = psutil.Process(driver.service.process.pid)
+        processes = [process] + process.children(recursive=True)
+        return sum(p.memory_info().rss for p in processes) / (1024 * 1024)
+    except (AttributeError, psutil.Error):
+        return 0
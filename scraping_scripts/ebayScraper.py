@@ -1,75 +1,86 @@
-from bs4 import BeautifulSoup
-import random
-import time
 from datetime import datetime
 import logging
-from concurrent.futures import ThreadPoolExecutor
 import os
 from scraping_scripts.headers import headers, user_agents
-from scraping_scripts.utils import get_with_retries, load_visited_urls, save_to_csv, save_visted_url
+from scraping_scripts.parsers import parse_html
+from scraping_scripts.utils import get_crawl_frontier, get_with_retries, save_data, sink, log_errors
+from scraping_scripts.fetcher import fetch_all
+from scraping_scripts.pagination import ListingPages, page_urls
+from scraping_scripts.parse_pool import submit_parse
+from scraping_scripts.scheduler import Crawl, exhaust, scrape_all
+
+# errors of the site, written to logs/ebay_scraping_errors.log by log_errors
+logger = logging.getLogger("ebay")
+
+# number of product pages fetched at the same time
+MAX_CONCURRENCY = 8
+
+TARGETS = [
+    {
+        "category": "smartphones",
+        "url": "https://www.ebay.com/sch/i.html?_nkw=smartphones&_sacat=0&_from=R40&_pgn=1",
+        "max_pages": 6,
+    },
+    {
+        "category": "laptops",
+        "url": "https://www.ebay.com/sch/i.html?_nkw=laptops&_sacat=0&_from=R40&_pgn=1",
+        "max_pages": 6,
+    },
+    {
+        "category": "tablets",
+        "url": "https://www.ebay.com/sch/i.html?_nkw=tablets&_sacat=0&_from=R40&_pgn=1",
+        "max_pages": 6,
+    }
+]
+
+# item specifics labels (the ux-labels-values--<label> class) of each field in every supported locale,
+# tried in order. To support a new locale, add its labels here
+ITEM_SPECIFICS_ALIASES = {
+    "brand": ["brand", "marque", "marke", "marca"],
+    "model": ["model", "modèle", "modell", "modello"],
+    "processor": ["processor", "processeur", "prozessor", "processore"],
+    "ram": ["ram", "ramSize", "arbeitsspeichergröße", "memoriaRam"],
+    "storage": [
+        "storageCapacity", "hardDriveCapacity", "ssdCapacity", "capacitéDeStockage",
+        "speicherkapazität", "capacitàDiMemorizzazione",
+    ],
+}
+
+
+def extract_item_specifics(soup) -> dict:
+    # walks the item specifics blocks once and maps each label to its value
+    item_specifics = {}
+    for block in soup.select(".ux-labels-values"):
+        labels = [
+            css_class[len("ux-labels-values--"):].lower() for css_class in block.get("class", [])
+            if css_class.startswith("ux-labels-values--") and css_class != "ux-labels-values--inline"
+        ]
+        if not labels or labels[0] in item_specifics:
+            continue
+        value = block.select_one(".ux-labels-values__values")
+        if value:
+            item_specifics[labels[0]] = value.text.strip()
+    return item_specifics
+
+
+def resolve_item_specific(item_specifics: dict, aliases: list):
+    for alias in aliases:
+        value = item_specifics.get(alias.lower())
+        if value is not None:
+            return value
+    return None
+
 
 # extracts a single product data and saves it
-def extract_data(html: str, category: str, data: list):
-    soup = BeautifulSoup(html, "html.parser")
-
-    brand = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values--brand"] > [class="ux-labels-values__values"]')
-    if not brand:
-        brand = soup.select_one('[class="ux-labels-values col-6 ux-labels-values--marque"] > [class="ux-labels-values__values"]')
-    if not brand:
-        brand = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values--marke"] > [class="ux-labels-values__values"]')
-    if not brand:
-        brand = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values--marca"] > [class="ux-labels-values__values"]')
-    if not brand:
-        brand = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values__column-last-row ux-labels-values--brand"] > [class="ux-labels-values__values"]')
-    brand = brand.text.strip() if brand else None
-
-    model = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values--model"] > [class="ux-labels-values__values"]')
-    if not model:
-        model = soup.select_one('[class="ux-labels-values col-6 ux-labels-values__column-last-row ux-labels-values--modèle"] > [class="ux-labels-values__values"]')
-    if not model:
-        model = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values--modell"] > [class="ux-labels-values__values"]')
-    if not model:
-        model = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values--modello"] > [class="ux-labels-values__values"]')
-    if not model:
-        model = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values__column-last-row ux-labels-values--model"] > [class="ux-labels-values__values"]')
-    model = model.text.strip() if model else None
-    
-    processor = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values--processor"] > [class="ux-labels-values__values"]')
-    if not processor:
-        processor = soup.select_one('[class="ux-labels-values col-6 ux-labels-values--processeur"] > [class="ux-labels-values__values"]')
-    if not processor:
-        processor = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values--prozessor"] > [class="ux-labels-values__values"]')
-    if not processor:
-        processor = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values--processore"] > [class="ux-labels-values__values"]')
-    processor = processor.text.strip() if processor else None
-
-    ram = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values--ram"] > [class="ux-labels-values__values"]')
-    if not ram:
-        ram = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values__column-last-row ux-labels-values--ram"] > [class="ux-labels-values__values"]')
-    if not ram:
-        ram = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values--ramSize"] > [class="ux-labels-values__values"]')
-    if not ram:
-        ram = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values__column-last-row ux-labels-values--arbeitsspeichergröße"] > [class="ux-labels-values__values"]')
-    if not ram:
-        ram = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values--memoriaRam"] > [class="ux-labels-values__values"]')
-    ram = ram.text.strip() if ram else None
-
-    storage = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values--storageCapacity"] > [class="ux-labels-values__values"]')
-    if not storage:
-        storage = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values__column-last-row ux-labels-values--storageCapacity"] > [class="ux-labels-values__values"]')
-    if not storage:
-        storage = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values--hardDriveCapacity"] > [class="ux-labels-values__values"]')
-    if not storage:
-        storage = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values--ssdCapacity"] > [class="ux-labels-values__values"]')
-    if not storage:
-        storage = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values__column-last-row ux-labels-values--storageCapacity"] > [class="ux-labels-values__values"]')
-    if not storage:
-        storage = soup.select_one('[class="ux-labels-values col-6 ux-labels-values--capacitéDeStockage"] > [class="ux-labels-values__values"]')
-    if not storage:
-        storage = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values__column-last-row ux-labels-values--speicherkapazität"] > [class="ux-labels-values__values"]')
-    if not storage:
-        storage = soup.select_one('[class="ux-labels-values ux-labels-values--inline col-6 ux-labels-values--capacitàDiMemorizzazione"] > [class="ux-labels-values__values"]')
-    storage = storage.text.strip() if storage else None
+def extract_data(html: str, category: str, data: list, aliases: dict = ITEM_SPECIFICS_ALIASES):
+    soup = parse_html(html)
+
+    item_specifics = extract_item_specifics(soup)
+    brand = resolve_item_specific(item_specifics, aliases["brand"])
+    model = resolve_item_specific(item_specifics, aliases["model"])
+    processor = resolve_item_specific(item_specifics, aliases["processor"])
+    ram = resolve_item_specific(item_specifics, aliases["ram"])
+    storage = resolve_item_specific(item_specifics, aliases["storage"])
 
     price = soup.select_one('[data-testid="x-price-primary"]')
     price = price.text.strip() if price else None
@@ -91,133 +102,128 @@ def extract_data(html: str, category: str, data: list):
     })
 
 
-def scrape_data(url: str, headers: dict, category: str, max_pages: int, processed_categories: set) -> bool:
+def extract_product_links(html: str) -> list:
+    # product links of a listing page
+    products_list = parse_html(html).select_one('[class="srp-results srp-list clearfix"]')
+    if not products_list:
+        return []
+    return [a_tag.get("href").strip() for a_tag in products_list.select('ul a[class="s-item__link"]')]
+
+
+def scrape_pages(url: str, headers: dict, category: str, max_pages: int, processed_categories: set):
+    """Scrapes the listing pages of a category and their products, one page per step, returns True on an error."""
+    crawl_frontier = get_crawl_frontier()
     is_error = False
     data = []   
 
+    # the listing pages are fetched ahead, the Referer of each one is the page before it
+    urls = page_urls(url, "_pgn", 1, max_pages)
+    listing_headers = dict(headers)
+
+    def fetch_links(page_number, page_url):
+        # product links of a listing page, none past the last page
+        response = get_with_retries(page_url, headers={**listing_headers, "Referer": urls.get(page_number - 1, listing_headers.get("Referer"))}, site="ebay")
+        if response.status_code != 200:
+            raise Exception(f"Error fetching {page_url}: Status code {response.status_code}")
+        return extract_product_links(response.text)
+
+    pages = ListingPages(urls, fetch_links, site="ebay")
     page_number = 1
-    visited_urls = load_visited_urls(file_path=f"cache/ebay_visited_{category}_urls.txt")
 
-    while page_number <= max_pages:
-        try:
-            response = get_with_retries(url, headers=headers)
-            if response.status_code != 200:
-                is_error = True
-                print(f"Error fetching {url}: Status code {response.status_code}")
-                break
-            
-            soup = BeautifulSoup(response.text, "html.parser")
-            products_list = soup.select_one('[class="srp-results srp-list clearfix"]')
+    try:
+        for page_number, url, listing_page in pages:
+            try:
+                product_links = listing_page.result()
+                if not product_links:
+                    print(f"No products found on page {page_number} for {category} - {url=}")
+                    continue
 
-            if not products_list:
-                print(f"No products found on page {page_number} for {category} - {url=}")
-                break
+                headers["Referer"] = url  # Update Referer header
 
-            a_tags = products_list.select('ul a[class="s-item__link"]')
-            headers["Referer"] = url  # Update Referer header
-            
-            for a_tag in a_tags:
-                a_tag_href = a_tag.get("href").strip()
+                # skip the products already scraped by an interrupted run
+                links = crawl_frontier.add("ebay", category, product_links)
+                crawl_frontier.start("ebay", category, links)
 
-                if a_tag_href in visited_urls:
-                    # print(f"Skipping already visited page: {a_tag_href}")
-                    continue
+                # pages are parsed in the parser processes while the next ones are being fetched
+                parsed_pages = {}
 
-                time.sleep(random.uniform(4, 8))
-                headers["User-Agent"] = random.choice(user_agents)
-                page = get_with_retries(a_tag_href, headers=headers)
-                if page.status_code == 200:
-                    visited_urls.add(a_tag_href)
-                    extract_data(html=page.text, category=category, data=data)
-
-            save_to_csv(file_path=f"data/ebay_{category}.csv", data=data, category=category, processed_categories=processed_categories)
-            save_visted_url(file_path=f"cache/ebay_visited_{category}_urls.txt", visited_urls=visited_urls)
-
-            # Move to the next page
-            page_number += 1
-            url = url.replace(f"_pgn={page_number-1}", f"_pgn={page_number}")
-
-        except Exception as e:
-            save_to_csv(file_path=f"data/ebay_{category}.csv", data=data, category=category, processed_categories=processed_categories)
-            save_visted_url(file_path=f"cache/ebay_visited_{category}_urls.txt", visited_urls=visited_urls)
-            is_error = True
-            current_time = datetime.now()
-            print(f"Error while scraping ebay, page {page_number} of {category}:")
-            print(e)
-            logging.error(f"{current_time} : Error on page {page_number} of {category}: {url}:")
-            logging.error(e)
-            break
-            
-    return is_error
+                def handle_page(link, page):
+                    if page.status_code == 200:
+                        parsed_pages[link] = submit_parse("ebay", page.text, category)
 
+                failed = fetch_all(links, parse=handle_page, headers=headers, user_agents=user_agents, max_concurrency=MAX_CONCURRENCY, site="ebay")
+                for link, error in failed:
+                    crawl_frontier.fail("ebay", category, link, error)
 
-def scrape_wrapper(target: dict, processed_categories: set) -> bool:
-    print(f"scraping data started for category {target['category']} in ebay")
+                scraped = []
+                for link, parsed_page in parsed_pages.items():
+                    try:
+                        data.extend(parsed_page.result())
+                        scraped.append(link)
+                    except Exception as e:
+                        crawl_frontier.fail("ebay", category, link, e)
 
-    error = scrape_data(
-        url=target["url"], 
-        headers=headers, 
-        category=target['category'], 
-        max_pages=target["max_pages"], 
-        processed_categories=processed_categories
-    )
+                # a product is done once its rows are saved
+                save_data(site="ebay", category=category, data=data, processed_categories=processed_categories)
+                crawl_frontier.done("ebay", category, scraped)
 
-    if not error:
-        print(f"scraping data finished for category {target['category']} in ebay")
-    else:
-        print(f"something went worng when scraping data for category {target['category']} in ebay, please check log and cache files")
+                if failed:
+                    link, error = failed[0]
+                    raise Exception(f"Failed to fetch {len(failed)} product pages on page {page_number}, first: {link}: {error}")
 
-    return error
+                yield page_number
 
+            except Exception as e:
+                is_error = True
+                current_time = datetime.now()
+                print(f"Error while scraping ebay, page {page_number} of {category}:")
+                print(e)
+                logger.error(f"{current_time} : Error on page {page_number} of {category}: {url}:")
+                logger.error(e)
+                break
+    finally:
+        pages.close()
+            
+    return is_error
 
-def main():
+
+def scrape_data(url: str, headers: dict, category: str, max_pages: int, processed_categories: set) -> bool:
+    return exhaust(scrape_pages(url, headers, category, max_pages, processed_categories))
+
+
+def page_crawls() -> list:
+    """The crawl of every target, for the scheduler."""
     #Tracks categories to prevent redundant CSV headers.
     processed_categories = set()
 
-    errors = []
-
-    logging.basicConfig(filename="logs/ebay_scraping_errors.log", level=logging.ERROR)
-
-    targets = [
-        {
-            "category": "smartphones",
-            "url": "https://www.ebay.com/sch/i.html?_nkw=smartphones&_sacat=0&_from=R40&_pgn=1",
-            "max_pages": 6,
-        },
-        {
-            "category": "laptops",
-            "url": "https://www.ebay.com/sch/i.html?_nkw=laptops&_sacat=0&_from=R40&_pgn=1",
-            "max_pages": 6,
-        },
-        {
-            "category": "tablets",
-            "url": "https://www.ebay.com/sch/i.html?_nkw=tablets&_sacat=0&_from=R40&_pgn=1",
-            "max_pages": 6,
-        }
-    ]
+    # products left in flight by an interrupted run are scraped again
+    get_crawl_frontier().recover("ebay")
 
-    for target in targets:
-        if os.path.exists(f"data/ebay_{target['category']}.csv"): # if file exists:
-            with open(f"data/ebay_{target['category']}.csv", mode="r") as file:
+    for target in TARGETS:
+        path = os.path.join(sink.base_dir, "data", f"ebay_{target['category']}.csv")
+        if os.path.exists(path): # if file exists:
+            with open(path, mode="r") as file:
                 if file.read(1): # if file is not empty
                     # ensure that the headers are not written to the csv file as it is not empty
                     processed_categories.add(target['category'])
 
-    # Use ThreadPoolExecutor to run scraping in parallel
-    with ThreadPoolExecutor(max_workers=3) as executer:
-        futures = [executer.submit(scrape_wrapper, target, processed_categories) for target in targets]
+    return [
+        Crawl("ebay", target["category"], target["max_pages"], scrape_pages(
+            url=target["url"],
+            headers=dict(headers),  # the Referer of each category
+            category=target["category"],
+            max_pages=target["max_pages"],
+            processed_categories=processed_categories,
+        ))
+        for target in TARGETS
+    ]
 
-        for future in futures:
-            errors.append(future.result())
 
-        
-    # if no error, then the scraping finished successfully, truncate the cache/ebay_visited_urls.txt
-    if not any(errors):
-        for target in targets:
-            cache_file = f"cache/ebay_visited_{target['category']}_urls.txt"
-            if os.path.exists(cache_file):
-                os.remove(cache_file)
-    
+def main():
+    log_errors("ebay")
+
+    scrape_all(page_crawls(), get_crawl_frontier())
+
     print("scraping data finished for ebay")
 
 
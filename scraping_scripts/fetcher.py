@@ -0,0 +1,42 @@
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+from scraping_scripts.utils import get_with_retries
+
+
+def _fetch_one(url: str, host_limit: threading.Semaphore, headers: dict, user_agents: list, request_kwargs: dict):
+    # the host's politeness budget caps its requests in flight, their rate is paced by the shared rate limiter in get_with_retries
+    with host_limit:
+        request_headers = dict(headers)
+        if user_agents:
+            request_headers["User-Agent"] = random.choice(user_agents)
+        return get_with_retries(url, headers=request_headers, **request_kwargs)
+
+
+def fetch_all(urls: list, parse, headers: dict, user_agents: list = None, max_concurrency: int = 8, per_host_limit: int = 4, **request_kwargs) -> list:
+    """Fetches a batch of urls concurrently and calls parse(url, response) for each one as it completes.
+
+    Returns the (url, exception) pairs of the urls that could not be fetched.
+    """
+    if not urls:
+        return []
+    host_limits = {host: threading.Semaphore(per_host_limit) for host in {urlparse(url).netloc for url in urls}}
+    failed = []
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = {
+            executor.submit(_fetch_one, url, host_limits[urlparse(url).netloc], headers, user_agents, request_kwargs): url
+            for url in urls
+        }
+        # hand every response to the parser as soon as it arrives, not in submission order
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                response = future.result()
+            except Exception as e:
+                failed.append((url, e))
+                continue
+            parse(url, response)
+
+    return failed
@@ -1,13 +1,36 @@
 from bs4 import BeautifulSoup
 import random
-import time
 from datetime import datetime
 import logging
-from concurrent.futures import ThreadPoolExecutor
 import os
 import re
 from scraping_scripts.headers import headers
-from scraping_scripts.utils import get_with_retries, load_visited_urls, save_to_csv, save_visted_url
+from scraping_scripts.parsers import parse_html
+from scraping_scripts.utils import get_crawl_frontier, get_with_retries, save_data, sink, log_errors
+from scraping_scripts.pagination import ListingPages, page_urls
+from scraping_scripts.parse_pool import submit_parse
+from scraping_scripts.scheduler import Crawl, exhaust, scrape_all
+
+# errors of the site, written to logs/flipkart_scraping_errors.log by log_errors
+logger = logging.getLogger("flipkart")
+
+TARGETS = [
+    {
+        "category": "smartphones",
+        "url": "https://www.flipkart.com/search?q=smartphones&otracker=search&otracker1=search&marketplace=FLIPKART&as-show=off&as=off&page=1",
+        "max_pages": 8,
+    },
+    {
+        "category": "laptops",
+        "url": "https://www.flipkart.com/search?q=laptops&otracker=search&otracker1=search&marketplace=FLIPKART&as-show=on&as=off&page=1",
+        "max_pages": 10,
+    },
+    {
+        "category": "tablets",
+        "url": "https://www.flipkart.com/search?q=tablets&otracker=search&otracker1=search&marketplace=FLIPKART&as-show=on&as=off&page=1",
+        "max_pages": 8,
+    }
+]
 
 def extract_smartphone_data(soup: BeautifulSoup) -> dict:
         processor = ram = storage = None
@@ -60,9 +83,10 @@ def extract_tablet_data(soup: BeautifulSoup) -> dict:
     return {"processor": processor, "ram": ram, "storage": storage}
 
 
-# extracts a single product data and saves it
-def extract_data(soup: BeautifulSoup, category: str, data: list):
-    
+# extracts the data of every product of a listing page and saves it
+def extract_data(html: str, category: str, data: list):
+    soup = parse_html(html)
+
     products = soup.select("[class='DOjaWF gdgoEp'] > [class='cPHDOP col-12-12'] > div > div > div > a > [class='yKfJKb row']")
 
     for product in products:
@@ -106,15 +130,13 @@ def extract_data(soup: BeautifulSoup, category: str, data: list):
         })
 
 
-def scrape_data(url: str, headers: dict, category: str, max_pages: int, processed_categories: set) -> bool: 
+def scrape_pages(url: str, headers: dict, category: str, max_pages: int, processed_categories: set):
+    """Scrapes the listing pages of a category, one page per step, returns True on an error."""
+    crawl_frontier = get_crawl_frontier()
     is_error = False
     data = []   
 
     base_url = "https://www.flipkart.com"
-    headers["Referer"] = base_url  # Update Referer header
-
-    page_number = 1
-    visited_urls = load_visited_urls(file_path=f"cache/flipkart_visited_{category}_urls.txt")
 
     user_agents = [
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
@@ -122,114 +144,94 @@ def scrape_data(url: str, headers: dict, category: str, max_pages: int, processe
         "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/94.0.4606.81 Safari/537.36",
     ]
 
-    while page_number <= max_pages:
-        try:
-            headers["User-Agent"] = random.choice(user_agents)
-            response = get_with_retries(url, headers=headers, withProxy=False)
-            if response.status_code != 200:
-                is_error = True
-                print(f"Error fetching {url}: Status code {response.status_code}")
-                break
-            
-            soup = BeautifulSoup(response.text, "html.parser")
-            products_list = soup.select_one("[class='DOjaWF gdgoEp']")
+    # the products are read from the listing pages, skip the pages already scraped by an interrupted run
+    all_urls = page_urls(url, "page", 1, max_pages)
+    urls = {page_number: page_url for page_number, page_url in all_urls.items() if crawl_frontier.add("flipkart", category, [page_url])}
+
+    def fetch_page(page_number, page_url):
+        crawl_frontier.start("flipkart", category, [page_url])
+        # the Referer of a page is the page before it
+        page_headers = {**headers, "Referer": all_urls.get(page_number - 1, base_url), "User-Agent": random.choice(user_agents)}
+        response = get_with_retries(page_url, headers=page_headers, withProxy=False, site="flipkart")
+        if response.status_code != 200:
+            raise Exception(f"Error fetching {page_url}: Status code {response.status_code}")
+        # the rows of the page, none past the last page
+        return submit_parse("flipkart", response.text, category).result()
+
+    pages = ListingPages(urls, fetch_page, site="flipkart")
+    page_number = 1
 
-            if not products_list:
-                print(f"No products found on page {page_number} for {category} - {url=}")
-                break
+    try:
+        for page_number, url, listing_page in pages:
+            try:
+                rows = listing_page.result()
 
-            extract_data(soup=soup, category=category, data=data)
-
-            save_to_csv(file_path=f"data/flipkart_{category}.csv", data=data, category=category, processed_categories=processed_categories)
-            save_visted_url(file_path=f"cache/flipkart_visited_{category}_urls.txt", visited_urls=visited_urls)
-
-            # Move to the next page
-            page_number += 1
-            headers["Referer"] = url  # Update Referer header
-            url = url.replace(f"&page={page_number-1}", f"&page={page_number}")
-            time.sleep(random.uniform(4, 8))
-
-        except Exception as e:
-            save_to_csv(file_path=f"data/flipkart_{category}.csv", data=data, category=category, processed_categories=processed_categories)
-            save_visted_url(file_path=f"cache/flipkart_visited_{category}_urls.txt", visited_urls=visited_urls)
-            is_error = True
-            current_time = datetime.now()
-            print(f"Error while scraping flipkart, page {page_number} of {category}:")
-            print(e)
-            logging.error(f"{current_time} : Error on page {page_number} of {category}: {url}:")
-            logging.error(e)
-            break
-            
-    return is_error
+                if not rows:
+                    print(f"No products found on page {page_number} for {category} - {url=}")
+                    crawl_frontier.done("flipkart", category, [url])
+                    continue
 
+                data.extend(rows)
 
-def scrape_wrapper(target: dict, processed_categories: set) -> bool:
-    print(f"scraping data started for category {target['category']} in flipkart")
+                # the page is done once its rows are saved
+                save_data(site="flipkart", category=category, data=data, processed_categories=processed_categories)
+                crawl_frontier.done("flipkart", category, [url])
+                yield page_number
 
-    error = scrape_data(
-        url=target["url"], 
-        headers=headers, 
-        category=target['category'], 
-        max_pages=target["max_pages"], 
-        processed_categories=processed_categories
-    )
+            except Exception as e:
+                crawl_frontier.fail("flipkart", category, url, e)
+                is_error = True
+                current_time = datetime.now()
+                print(f"Error while scraping flipkart, page {page_number} of {category}:")
+                print(e)
+                logger.error(f"{current_time} : Error on page {page_number} of {category}: {url}:")
+                logger.error(e)
+                break
+    finally:
+        pages.close()
+        # pages after the last one are not part of the category, they are forgotten instead of left in flight
+        crawl_frontier.discard("flipkart", category, list(pages.past_last().values()))
+            
+    return is_error
 
-    if not error:
-        print(f"scraping data finished for category {target['category']} in flipkart")
-    else:
-        print(f"something went worng when scraping data for category {target['category']} in flipkart, please check log and cache files")
 
-    return error
+def scrape_data(url: str, headers: dict, category: str, max_pages: int, processed_categories: set) -> bool:
+    return exhaust(scrape_pages(url, headers, category, max_pages, processed_categories))
 
 
-def main():
+def page_crawls() -> list:
+    """The crawl of every target, for the scheduler."""
     #Tracks categories to prevent redundant CSV headers.
     processed_categories = set()
 
-    errors = []
-
-    logging.basicConfig(filename="logs/flipkart_scraping_errors.log", level=logging.ERROR)
-
-    targets = [
-        {
-            "category": "smartphones",
-            "url": "https://www.flipkart.com/search?q=smartphones&otracker=search&otracker1=search&marketplace=FLIPKART&as-show=off&as=off&page=1",
-            "max_pages": 8,
-        },
-        {
-            "category": "laptops",
-            "url": "https://www.flipkart.com/search?q=laptops&otracker=search&otracker1=search&marketplace=FLIPKART&as-show=on&as=off&page=1",
-            "max_pages": 10,
-        },
-        {
-            "category": "tablets",
-            "url": "https://www.flipkart.com/search?q=tablets&otracker=search&otracker1=search&marketplace=FLIPKART&as-show=on&as=off&page=1",
-            "max_pages": 8,
-        }
-    ]
+    # pages left in flight by an interrupted run are scraped again
+    get_crawl_frontier().recover("flipkart")
 
-    for target in targets:
-        if os.path.exists(f"data/flipkart_{target['category']}.csv"): # if file exists:
-            with open(f"data/flipkart_{target['category']}.csv", mode="r") as file:
+    for target in TARGETS:
+        path = os.path.join(sink.base_dir, "data", f"flipkart_{target['category']}.csv")
+        if os.path.exists(path): # if file exists:
+            with open(path, mode="r") as file:
                 if file.read(1): # if file is not empty
                     # ensure that the headers are not written to the csv file as it is not empty
                     processed_categories.add(target['category'])
 
-    # Use ThreadPoolExecutor to run scraping in parallel
-    with ThreadPoolExecutor(max_workers=3) as executer:
-        futures = [executer.submit(scrape_wrapper, target, processed_categories) for target in targets]
+    return [
+        Crawl("flipkart", target["category"], target["max_pages"], scrape_pages(
+            url=target["url"],
+            headers=dict(headers),  # the Referer and User-Agent of each category
+            category=target["category"],
+            max_pages=target["max_pages"],
+            processed_categories=processed_categories,
+        ))
+        for target in TARGETS
+    ]
 
-        for future in futures:
-            errors.append(future.result())
 
-        
-    # if no error, then the scraping finished successfully, truncate the cache/flipkart_visited_urls.txt
-    if not any(errors):
-        for target in targets:
-            cache_file = f"cache/flipkart_visited_{target['category']}_urls.txt"
-            if os.path.exists(cache_file):
-                os.remove(cache_file)
-    
+def main():
+    log_errors("flipkart")
+
+    scrape_all(page_crawls(), get_crawl_frontier())
+
     print("scraping data finished for flipkart")
 
 
@@ -0,0 +1,148 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# response headers kept with a cached page: how to decode it and how to revalidate it
+KEPT_HEADERS = ["Content-Type", "ETag", "Last-Modified"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    headers TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_by_use ON responses (used_at);
+CREATE TABLE IF NOT EXISTS bodies (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+"""
+
+
+class CachedResponse:
+    def __init__(self, url: str, digest: str, headers: dict, fetched_at: float):
+        self.url = url
+        self.digest = digest
+        self.headers = headers
+        self.fetched_at = fetched_at
+
+    def validators(self) -> dict:
+        # headers of a conditional request, the server answers 304 if the page did not change
+        validators = {}
+        if "ETag" in self.headers:
+            validators["If-None-Match"] = self.headers["ETag"]
+        if "Last-Modified" in self.headers:
+            validators["If-Modified-Since"] = self.headers["Last-Modified"]
+        return validators
+
+
+class ResponseCache:
+    """On-disk cache of the pages fetched by get_with_retries.
+
+    Bodies are gzipped files named after the sha256 of their content (pages that did not change
+    are stored once), an sqlite index maps each url to its body. Pages younger than `ttl` seconds
+    are served without a request, older ones are revalidated with their ETag / Last-Modified.
+    Past `max_bytes` of compressed bodies, the least recently used pages are evicted. In offline
+    mode pages are only read from the cache, whatever their age.
+    """
+
+    def __init__(self, directory: str = "cache/http", ttl: float = 3600, max_bytes: int = 1024 ** 3, offline: bool = False):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        os.makedirs(os.path.join(directory, "bodies"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(SCHEMA)
+
+    def _body_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "bodies", digest[:2], f"{digest}.gz")
+
+    def lookup(self, url: str) -> CachedResponse:
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT digest, headers, fetched_at FROM responses WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE responses SET used_at = ? WHERE url = ?", (time.time(), url))
+        return CachedResponse(url, row[0], json.loads(row[1]), row[2])
+
+    def is_fresh(self, cached: CachedResponse) -> bool:
+        return self.offline or time.time() - cached.fetched_at < self.ttl
+
+    def response(self, cached: CachedResponse) -> requests.Response:
+        """Rebuilds the response of a cached page, None if its body was evicted since the lookup."""
+        try:
+            with open(self._body_path(cached.digest), "rb") as f:
+                body = gzip.decompress(f.read())
+        except FileNotFoundError:
+            # another thread evicted the page between the lookup and this read: a miss
+            return None
+        response = requests.Response()
+        response.status_code = 200
+        response.url = cached.url
+        response.headers = CaseInsensitiveDict(cached.headers)
+        response._content = body
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
+
+    def store(self, url: str, response: requests.Response):
+        """Caches a successful response, then evicts the least recently used pages past max_bytes."""
+        if response.status_code != 200:
+            return
+        self.store_body(url, response.content, {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers})
+
+    def store_body(self, url: str, body: bytes, headers: dict):
+        """Caches a page that was not fetched with requests, e.g. a page rendered in the browser."""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._body_path(digest)
+        now = time.time()
+
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # write then rename, a crash never leaves a truncated body behind a digest
+                with open(f"{path}.{threading.get_ident()}.tmp", "wb") as f:
+                    f.write(gzip.compress(body, compresslevel=6))
+                os.replace(f"{path}.{threading.get_ident()}.tmp", path)
+            with self._connection:
+                self._connection.execute("INSERT OR IGNORE INTO bodies VALUES (?, ?)", (digest, os.path.getsize(path)))
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (url, digest, json.dumps(headers), now, now)
+                )
+            self._evict()
+
+    def revalidated(self, cached: CachedResponse, response: requests.Response) -> requests.Response:
+        """The server answered 304 Not Modified: the cached page is fresh again, None if its body was evicted meanwhile."""
+        headers = dict(cached.headers)
+        headers.update({name: response.headers[name] for name in ("ETag", "Last-Modified") if name in response.headers})
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE responses SET headers = ?, fetched_at = ? WHERE url = ?", (json.dumps(headers), time.time(), cached.url)
+            )
+        return self.response(CachedResponse(cached.url, cached.digest, headers, time.time()))
+
+    def _evict(self):
+        while self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0] > self.max_bytes:
+            with self._connection:
+                self._connection.execute(
+                    "DELETE FROM responses WHERE url IN (SELECT url FROM responses ORDER BY used_at LIMIT 100)"
+                )
+                orphans = [digest for (digest,) in self._connection.execute(
+                    "SELECT digest FROM bodies WHERE digest NOT IN (SELECT digest FROM responses)"
+                )]
+                self._connection.executemany("DELETE FROM bodies WHERE digest = ?", [(digest,) for digest in orphans])
+            for digest in orphans:
+                try:
+                    os.remove(self._body_path(digest))
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,268 @@
+import bisect
+import cProfile
+import glob
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# prefix of the exported metric names
+NAMESPACE = "pricing"
+
+# upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+
+
+def label_text(labels: tuple, bound: str = None) -> str:
+    # {name="value",...} of a sample, le="<bound>" for a histogram bucket
+    escaped = [(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in labels]
+    parts = [f'{name}="{value}"' for name, value in escaped + ([("le", bound)] if bound else [])]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def quantile(buckets: list, count: int, q: float) -> float:
+    # estimated from the buckets like prometheus' histogram_quantile, linear inside the bucket
+    if not count:
+        return None
+    rank = q * count
+    index = bisect.bisect_left(buckets, rank)
+    if index >= len(BUCKETS):
+        return BUCKETS[-1]
+    lower, below = (BUCKETS[index - 1], buckets[index - 1]) if index else (0, 0)
+    inside = buckets[index] - below
+    return lower + (BUCKETS[index] - lower) * ((rank - below) / inside if inside else 1)
+
+
+class Metrics:
+    """Counters, histograms and gauges of a run, each identified by a name and labels.
+
+    Everything is kept in memory behind one lock, cheap enough to be recorded on every request.
+    Worker processes send their metrics back with collect(), the parent adds them with merge().
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}  # key -> [cumulative count of each bucket, sum, count]
+        self._gauges = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def count(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        first = bisect.bisect_left(BUCKETS, value)
+        with self._lock:
+            histogram = self._histograms.setdefault(key, [[0] * len(BUCKETS), 0.0, 0])
+            for index in range(first, len(BUCKETS)):
+                histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def gauge_max(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = max(self._gauges.get(key, value), value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def collect(self) -> dict:
+        """Takes the metrics recorded so far, to be merged into the registry of another process."""
+        profiler.dump()
+        with self._lock:
+            snapshot = {"counters": self._counters, "histograms": self._histograms, "gauges": self._gauges}
+            self._counters, self._histograms, self._gauges = {}, {}, {}
+        return snapshot
+
+    def merge(self, snapshot: dict):
+        with self._lock:
+            for key, value in snapshot["counters"].items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, (buckets, total, count) in snapshot["histograms"].items():
+                histogram = self._histograms.setdefault(key, [[0] * len(BUCKETS), 0.0, 0])
+                histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+                histogram[1] += total
+                histogram[2] += count
+            for key, value in snapshot["gauges"].items():
+                self._gauges[key] = max(self._gauges.get(key, value), value)
+
+    def prometheus_text(self) -> str:
+        """The metrics in the prometheus text exposition format."""
+        with self._lock:
+            counters, gauges = dict(self._counters), dict(self._gauges)
+            histograms = {key: (list(buckets), total, count) for key, (buckets, total, count) in self._histograms.items()}
+
+        lines = []
+        for kind, values in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({name for name, _ in values}):
+                lines.append(f"# TYPE {NAMESPACE}_{name} {kind}")
+                lines.extend(f"{NAMESPACE}_{name}{label_text(labels)} {value}" for (other, labels), value in sorted(values.items()) if other == name)
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE {NAMESPACE}_{name} histogram")
+            for (other, labels), (buckets, total, count) in sorted(histograms.items()):
+                if other != name:
+                    continue
+                for bound, cumulative in zip(BUCKETS, buckets):
+                    lines.append(f"{NAMESPACE}_{name}_bucket{label_text(labels, str(bound))} {cumulative}")
+                lines.append(f"{NAMESPACE}_{name}_bucket{label_text(labels, '+Inf')} {count}")
+                lines.append(f"{NAMESPACE}_{name}_sum{label_text(labels)} {total}")
+                lines.append(f"{NAMESPACE}_{name}_count{label_text(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        """Totals of the run, with the mean and estimated quantiles of every histogram."""
+        with self._lock:
+            counters, gauges = dict(self._counters), dict(self._gauges)
+            histograms = {key: (list(buckets), total, count) for key, (buckets, total, count) in self._histograms.items()}
+        return {
+            "counters": {f"{name}{label_text(labels)}": value for (name, labels), value in sorted(counters.items())},
+            "gauges": {f"{name}{label_text(labels)}": value for (name, labels), value in sorted(gauges.items())},
+            "histograms": {
+                f"{name}{label_text(labels)}": {
+                    "count": count,
+                    "sum": total,
+                    "mean": total / count if count else None,
+                    "p50": quantile(buckets, count, 0.5),
+                    "p95": quantile(buckets, count, 0.95),
+                    "p99": quantile(buckets, count, 0.99),
+                }
+                for (name, labels), (buckets, total, count) in sorted(histograms.items())
+            },
+        }
+
+
+class StageProfiler:
+    """Opt-in cProfile / tracemalloc of the stages named in PROFILE_STAGES (e.g. "parse,clean").
+
+    Only one stage is profiled at a time, a stage entered while another thread is being profiled
+    just runs: cProfile follows a single thread and tracemalloc peaks are process wide. The calls of
+    a stage accumulate in one profile, dumped to <METRICS_DIR>/profiles/<stage>-<pid>.prof.
+    """
+
+    def __init__(self, stages: set, modes: set, directory: str):
+        self.stages = stages
+        self.modes = modes
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._profiles = {}
+
+    @contextmanager
+    def profile(self, stage: str):
+        if stage not in self.stages or not self._lock.acquire(blocking=False):
+            yield
+            return
+        try:
+            profile = self._profiles.setdefault(stage, cProfile.Profile()) if "cprofile" in self.modes else None
+            if profile:
+                try:
+                    profile.enable()
+                except ValueError:
+                    profile = None  # another profiler is running
+            if "tracemalloc" in self.modes:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+            try:
+                yield
+            finally:
+                if profile:
+                    profile.disable()
+                if "tracemalloc" in self.modes:
+                    metrics.gauge_max("stage_peak_allocated_bytes", tracemalloc.get_traced_memory()[1] - before, stage=stage)
+        finally:
+            self._lock.release()
+
+    def dump(self):
+        with self._lock:
+            for stage, profile in self._profiles.items():
+                os.makedirs(self.directory, exist_ok=True)
+                profile.dump_stats(os.path.join(self.directory, f"{stage}-{os.getpid()}.prof"))
+
+
+metrics = Metrics()
+profiler = StageProfiler(
+    stages={stage.strip() for stage in os.getenv("PROFILE_STAGES", "").split(",") if stage.strip()},
+    modes={mode.strip() for mode in os.getenv("PROFILE_MODE", "cprofile").split(",")},
+    directory=os.path.join(METRICS_DIR, "profiles"),
+)
+
+
+@contextmanager
+def stage(name: str, **labels):
+    """Times a stage of the pipeline in the <name>_seconds histogram, and profiles it if asked to."""
+    with metrics.timer(f"{name}_seconds", **labels), profiler.profile(name):
+        yield
+
+
+def write_prometheus(path: str):
+    with open(f"{path}.tmp", "w") as f:
+        f.write(metrics.prometheus_text())
+    os.replace(f"{path}.tmp", path)  # a collector never reads a half written file
+
+
+def serve_metrics(port: int) -> ThreadingHTTPServer:
+    """Serves the metrics in the prometheus format on http://<host>:<port>/metrics, in a background thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.prometheus_text().encode()
+            self.send_response(200 if self.path.startswith("/metrics") else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_metrics_server() -> ThreadingHTTPServer:
+    # the endpoint is only served when METRICS_PORT is set
+    port = os.getenv("METRICS_PORT")
+    return serve_metrics(int(port)) if port else None
+
+
+def export(run: str) -> str:
+    """Writes <METRICS_DIR>/<run>.prom and the json summary of the run, returns the path of the summary."""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    profiler.dump()
+    write_prometheus(os.path.join(METRICS_DIR, f"{run}.prom"))
+
+    finished_at = time.time()
+    summary = {
+        "run": run,
+        "started_at": datetime.fromtimestamp(metrics.started_at).isoformat(),
+        "finished_at": datetime.fromtimestamp(finished_at).isoformat(),
+        "duration_s": finished_at - metrics.started_at,
+        **metrics.summary(),
+        "profiles": sorted(path for path in glob.glob(os.path.join(profiler.directory, "*.prof")) if os.path.getmtime(path) >= metrics.started_at),
+    }
+    path = os.path.join(METRICS_DIR, f"{run}-{datetime.fromtimestamp(finished_at):%Y%m%d-%H%M%S}.json")
+    with open(path, "w") as f:
+        json.dump(summary, f, indent=2)
+    return path
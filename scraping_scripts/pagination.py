@@ -0,0 +1,117 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from scraping_scripts.metrics import metrics
+
+# listing pages of a category fetched at the same time, ahead of the scraping of their products
+LISTING_CONCURRENCY = int(os.getenv("LISTING_CONCURRENCY", 3))
+
+# budget of the thread running a crawl step, set by the scheduler
+_current = threading.local()
+
+
+def page_urls(url: str, parameter: str, first_page: int, max_pages: int) -> dict:
+    """Url of every listing page of a category, by page number: the url of the first page with its
+    `parameter` (_pgn, page) set to each page number."""
+    pattern = re.compile(rf"([?&]{re.escape(parameter)}=)\d+")
+    return {page: pattern.sub(rf"\g<1>{page}", url) for page in range(first_page, first_page + max_pages)}
+
+
+class FetchBudget:
+    """Listing pages fetched at the same time over every crawl: at most `total`, and at most the limit of their site.
+
+    Owned by the scheduler, so the pages fetched ahead by the crawls share its workers and per-site limits
+    instead of adding LISTING_CONCURRENCY requests to each crawl in progress.
+    """
+
+    def __init__(self, total: int, site_limits: dict, default_site_limit: int):
+        self.site_limits = site_limits
+        self.default_site_limit = default_site_limit
+        self._total = threading.BoundedSemaphore(max(1, total))
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def _site(self, site: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if site not in self._sites:
+                self._sites[site] = threading.BoundedSemaphore(max(1, self.site_limits.get(site, self.default_site_limit)))
+            return self._sites[site]
+
+    @contextmanager
+    def slot(self, site: str):
+        # always the site first, then the total, so two fetches never wait on each other
+        with self._site(site), self._total:
+            yield
+
+    @contextmanager
+    def current(self):
+        """Makes the budget the one of the ListingPages created by the calling thread."""
+        previous = getattr(_current, "budget", None)
+        _current.budget = self
+        try:
+            yield
+        finally:
+            _current.budget = previous
+
+
+class ListingPages:
+    """The listing pages of a category, fetched `concurrency` at a time ahead of their processing.
+
+    Pages are handed over as soon as they arrive, not in page order, so the product links of a page
+    reach the detail stage while the next pages are still being fetched. `fetch(page, url)` returns
+    what the scraper needs of a page (its product links, its rows), empty past the end of the
+    listing: as soon as such a page is fetched, the fetches of the pages after it are cancelled and
+    their results dropped. Inside a scheduler, every fetch also waits for a slot of the scheduler's
+    FetchBudget.
+    """
+
+    def __init__(self, urls: dict, fetch, site: str = None, concurrency: int = LISTING_CONCURRENCY, budget: FetchBudget = None):
+        self.site = site
+        self.urls = urls
+        self.budget = budget or getattr(_current, "budget", None)
+        self.last = max(urls, default=0)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix=f"{site}-listing")
+        # submitted in page order, the first pages are fetched first
+        self._futures = {self._executor.submit(self._fetch, fetch, page, url): (page, url) for page, url in sorted(urls.items())}
+
+    def _fetch(self, fetch, page: int, url: str):
+        if self.budget is None:
+            return self._fetch_page(fetch, page, url)
+        with self.budget.slot(self.site):
+            return self._fetch_page(fetch, page, url)
+
+    def _fetch_page(self, fetch, page: int, url: str):
+        if page > self.last:
+            return None  # the listing ended while the page was waiting for its turn
+        result = fetch(page, url)
+        if not result:
+            self.last_page(page - 1)
+        return result
+
+    def __iter__(self):
+        """(page number, url, future of the fetched page) of the pages up to the last one, as they arrive."""
+        for future in as_completed(self._futures):
+            page, url = self._futures[future]
+            if future.cancelled() or page > self.last:
+                continue
+            yield page, url, future
+
+    def last_page(self, page: int):
+        """The listing ends at `page` (or before), the pages after it are not fetched."""
+        with self._lock:
+            self.last = min(self.last, page)
+            cancelled = sum(future.cancel() for future, (other, _) in self._futures.items() if other > self.last)
+        metrics.count("listing_pages_cancelled_total", cancelled, site=self.site)
+
+    def past_last(self) -> dict:
+        """Url of every page after the last one, by page number: fetched or cancelled, their results were dropped."""
+        with self._lock:
+            return {page: url for page, url in self.urls.items() if page > self.last}
+
+    def close(self):
+        for future in self._futures:
+            future.cancel()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,78 @@
+import importlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from scraping_scripts.metrics import metrics, stage
+
+SCRAPER_MODULES = {
+    "ebay": "scraping_scripts.ebayScraper",
+    "flipkart": "scraping_scripts.flipkartScraper",
+    "reliancedigital": "scraping_scripts.reliancedigitalScraper",
+}
+
+# number of parser processes, 0 parses in the calling thread
+PARSER_WORKERS = int(os.getenv("PARSER_WORKERS", os.cpu_count() or 1))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def parse_page(site: str, html: str, category: str) -> list:
+    """Runs the site's extract_data on a raw page and returns the extracted rows."""
+    module = importlib.import_module(SCRAPER_MODULES[site])
+    data = []
+    with stage("parse", site=site):
+        module.extract_data(html=html, category=category, data=data)
+    metrics.count("parsed_rows_total", len(data), site=site)
+    for row in data:
+        for field, value in row.items():
+            if value is None or value == "":
+                metrics.count("parse_missing_fields_total", site=site, field=field)
+    return data
+
+
+def parse_in_worker(site: str, html: str, category: str) -> tuple:
+    # the rows, and the metrics recorded in the parser process for the scraper process
+    return parse_page(site, html, category), metrics.collect()
+
+
+def merged_rows(parsed: Future, future: Future):
+    try:
+        rows, recorded = parsed.result()
+    except Exception as e:
+        future.set_exception(e)
+        return
+    metrics.merge(recorded)
+    future.set_result(rows)
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn instead of fork, the parent process is running network threads
+            _pool = ProcessPoolExecutor(max_workers=PARSER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def submit_parse(site: str, html: str, category: str) -> Future:
+    """Queues a raw page for parsing and returns a future of its rows."""
+    future = Future()
+    if PARSER_WORKERS <= 0:
+        try:
+            future.set_result(parse_page(site, html, category))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    # the rows are handed over once the metrics of the parser process are merged
+    get_parse_pool().submit(parse_in_worker, site, html, category).add_done_callback(lambda parsed: merged_rows(parsed, future))
+    return future
+
+
+def shutdown_parse_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -0,0 +1,61 @@
+import argparse
+import importlib
+import sys
+from scraping_scripts import parsers
+from scraping_scripts.parse_pool import SCRAPER_MODULES, parse_page
+
+
+def with_backend(backend: str, function, *args):
+    # calls function(*args) with the given parser backend
+    previous_backend = parsers.PARSER_BACKEND
+    parsers.PARSER_BACKEND = backend
+    try:
+        return function(*args)
+    finally:
+        parsers.PARSER_BACKEND = previous_backend
+
+
+def extract_rows(site: str, html: str, category: str, backend: str) -> list:
+    # runs the site's extract_data on a saved page with the given parser backend
+    return with_backend(backend, parse_page, site, html, category)
+
+
+def extract_links(site: str, html: str, backend: str) -> list:
+    # product links of a saved listing page of a site whose products have their own page (ebay, reliance digital)
+    return with_backend(backend, importlib.import_module(SCRAPER_MODULES[site]).extract_product_links, html)
+
+
+def compare_backends(site: str, category: str, paths: list) -> list:
+    """Extracts every saved page with both backends and returns the pages whose rows differ."""
+    mismatches = []
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            html = file.read()
+        expected = extract_rows(site, html, category, backend="bs4")
+        actual = extract_rows(site, html, category, backend="lxml")
+        if expected != actual:
+            mismatches.append((path, expected, actual))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the lxml backend extracts the same rows as BeautifulSoup")
+    parser.add_argument("site", choices=SCRAPER_MODULES)
+    parser.add_argument("category")
+    parser.add_argument("pages", nargs="+", help="saved html pages of the site")
+    args = parser.parse_args()
+
+    if parsers.lxml_html is None:
+        sys.exit("lxml is not installed, nothing to compare")
+
+    mismatches = compare_backends(args.site, args.category, args.pages)
+    for path, expected, actual in mismatches:
+        print(f"{path}:")
+        print(f"  bs4:  {expected}")
+        print(f"  lxml: {actual}")
+    print(f"{len(args.pages) - len(mismatches)}/{len(args.pages)} pages extracted identically")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
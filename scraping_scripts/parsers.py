@@ -0,0 +1,85 @@
+import os
+from functools import lru_cache
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+    from cssselect import GenericTranslator
+except ImportError:  # lxml is optional, BeautifulSoup is always available
+    lxml_html = None
+
+# "lxml" (fast, C based) or "bs4" (BeautifulSoup with html.parser)
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "lxml" if lxml_html else "bs4")
+
+
+class TextNode(str):
+    # A text child, behaves like a BeautifulSoup NavigableString for the extractors
+    @property
+    def text(self) -> str:
+        return str(self)
+
+    def select_one(self, selector: str):
+        return None
+
+    def select(self, selector: str) -> list:
+        return []
+
+
+class LxmlNode:
+    # Wraps an lxml element behind the subset of the BeautifulSoup Tag API used by the extractors
+    __slots__ = ("element", "is_document")
+
+    def __init__(self, element, is_document: bool = False):
+        self.element = element
+        self.is_document = is_document
+
+    def select(self, selector: str) -> list:
+        return [LxmlNode(element) for element in compile_selector(selector, self.is_document)(self.element)]
+
+    def select_one(self, selector: str):
+        matches = compile_selector(selector, self.is_document)(self.element)
+        return LxmlNode(matches[0]) if matches else None
+
+    @property
+    def text(self) -> str:
+        return self.element.text_content()
+
+    def get(self, attribute: str, default=None):
+        value = self.element.get(attribute)
+        if value is None:
+            return default
+        # BeautifulSoup returns multi-valued attributes as lists
+        return value.split() if attribute == "class" else value
+
+    @property
+    def children(self):
+        if self.element.text is not None:
+            yield TextNode(self.element.text)
+        for child in self.element:
+            if isinstance(child.tag, str):
+                yield LxmlNode(child)
+            if child.tail is not None:
+                yield TextNode(child.tail)
+
+
+if lxml_html is not None:
+    _translator = GenericTranslator()
+
+    @lru_cache(maxsize=None)
+    def compile_selector(selector: str, from_document: bool = False):
+        """Translates a CSS selector to a compiled XPath once, then reuses it for every page."""
+        # BeautifulSoup matches the <html> element itself when selecting from the document
+        prefix = "descendant-or-self::" if from_document else "descendant::"
+        return etree.XPath(_translator.css_to_xpath(selector, prefix=prefix))
+
+
+def parse_html(html: str, backend: str = None):
+    """Parses a page with the configured backend and returns a BeautifulSoup compatible root node."""
+    backend = backend or PARSER_BACKEND
+    if backend == "lxml" and lxml_html is not None:
+        try:
+            return LxmlNode(lxml_html.document_fromstring(html), is_document=True)
+        except (etree.ParserError, ValueError):
+            pass  # empty documents or documents with an encoding declaration
+    return BeautifulSoup(html, "html.parser")
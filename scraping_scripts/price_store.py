@@ -0,0 +1,267 @@
+import os
+import sqlite3
+import pandas as pd
+
+# columns of the cleaned rows kept in the store, a listing is one row per day at its minimum price
+KEY_COLUMNS = ["category", "website", "brand", "model", "processor", "ram", "storage", "scraping_date"]
+STORE_COLUMNS = KEY_COLUMNS + ["price", "promotion"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    category TEXT NOT NULL,
+    website TEXT NOT NULL,
+    brand TEXT NOT NULL,
+    model TEXT NOT NULL,
+    processor TEXT NOT NULL,
+    ram TEXT NOT NULL,
+    storage TEXT NOT NULL,
+    scraping_date TEXT NOT NULL,
+    price REAL NOT NULL,
+    promotion TEXT,
+    product_id TEXT,
+    PRIMARY KEY (category, website, brand, model, processor, ram, storage, scraping_date)
+);
+CREATE INDEX IF NOT EXISTS prices_by_listing ON prices (category, website, brand, model, scraping_date);
+CREATE INDEX IF NOT EXISTS prices_by_product ON prices (category, product_id, scraping_date);
+CREATE INDEX IF NOT EXISTS prices_by_day ON prices (category, website, scraping_date, price);
+
+CREATE TABLE IF NOT EXISTS daily_stats (
+    category TEXT NOT NULL,
+    website TEXT NOT NULL,
+    scraping_date TEXT NOT NULL,
+    listings INTEGER NOT NULL,
+    price_sum REAL NOT NULL,
+    price_sum_sq REAL NOT NULL,
+    min_price REAL NOT NULL,
+    q25_price REAL NOT NULL,
+    median_price REAL NOT NULL,
+    q75_price REAL NOT NULL,
+    max_price REAL NOT NULL,
+    PRIMARY KEY (category, website, scraping_date)
+);
+CREATE TABLE IF NOT EXISTS daily_histogram (
+    category TEXT NOT NULL,
+    website TEXT NOT NULL,
+    scraping_date TEXT NOT NULL,
+    bin INTEGER NOT NULL,
+    listings INTEGER NOT NULL,
+    PRIMARY KEY (category, website, scraping_date, bin)
+);
+"""
+
+# width (USD) of the bins of daily_histogram, charts merge them into wider bins
+HISTOGRAM_BIN_WIDTH = 10
+
+# same rule as the dedup of the cleaning script: the minimum price of the day wins, the known row on ties
+UPSERT = f"""
+INSERT INTO prices ({", ".join(STORE_COLUMNS)}) VALUES ({", ".join("?" for _ in STORE_COLUMNS)})
+ON CONFLICT ({", ".join(KEY_COLUMNS)}) DO UPDATE SET
+    promotion = CASE WHEN excluded.price < price THEN excluded.promotion ELSE promotion END,
+    price = MIN(price, excluded.price)
+"""
+
+
+class PriceStore:
+    """SQLite database of the cleaned prices of every day, for the analysis queries.
+
+    The cleaning script upserts the rows it cleans, the queries read the indexed table instead of
+    the whole cleaned history. Per (category, website, day) summaries and price histograms are kept
+    in daily_stats and daily_histogram, refresh_aggregates only recomputes the days that changed.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("PRICE_DB", os.path.join("cleaned_data", "prices.db"))
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("PRAGMA journal_mode=WAL")  # readers (the notebook) do not block the cleaning
+        self.connection.executescript(SCHEMA)
+        self._changed = False
+        self._touched = {}  # category -> (website, scraping_date) upserted since the last refresh, None for all
+
+    def has(self, category: str) -> bool:
+        return self.connection.execute("SELECT 1 FROM prices WHERE category = ? LIMIT 1", (category,)).fetchone() is not None
+
+    def clear(self, category: str):
+        """Removes the rows of a category, before storing it again from scratch."""
+        with self.connection:
+            self.connection.execute("DELETE FROM prices WHERE category = ?", (category,))
+        self._changed = True
+        self._touched[category] = None
+
+    def upsert(self, category: str, df: pd.DataFrame):
+        """Inserts cleaned rows, or lowers the price of the listings already stored for their day."""
+        df = df.assign(category=category)[STORE_COLUMNS].astype(object)
+        df = df.where(df.notna(), None)
+        with self.connection:
+            self.connection.executemany(UPSERT, df.itertuples(index=False, name=None))
+        self._changed = True
+        if self._touched.get(category, set()) is not None:
+            self._touched.setdefault(category, set()).update(zip(df["website"], df["scraping_date"]))
+
+    def set_product_ids(self, category: str, products: pd.DataFrame):
+        """Stores the product id of each (brand, model, ram, storage) of a category, see product_index."""
+        with self.connection:
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS products (brand, model, ram, storage, product_id)")
+            self.connection.execute("DELETE FROM products")
+            self.connection.executemany(
+                "INSERT INTO products VALUES (?, ?, ?, ?, ?)",
+                products[["brand", "model", "ram", "storage", "product_id"]].astype(object).itertuples(index=False, name=None),
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS temp.products_by_key ON products (brand, model, ram, storage)")
+            self.connection.execute(
+                """UPDATE prices SET product_id = (
+                       SELECT product_id FROM products
+                       WHERE products.brand = prices.brand AND products.model = prices.model
+                         AND products.ram = prices.ram AND products.storage = prices.storage
+                   ) WHERE category = ?""",
+                (category,),
+            )
+
+    def refresh_aggregates(self, category: str):
+        """Recomputes the daily summaries and histograms of the days upserted or cleared since the last refresh."""
+        touched = self._touched.pop(category, set())
+        if touched is not None and not touched:
+            return
+        with self.connection:
+            if touched is None:
+                for table in ("daily_stats", "daily_histogram"):
+                    self.connection.execute(f"DELETE FROM {table} WHERE category = ?", (category,))
+                rows = pd.read_sql_query(
+                    "SELECT website, scraping_date, price FROM prices WHERE category = ?", self.connection, params=[category]
+                )
+            else:
+                self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS touched_days (website, scraping_date)")
+                self.connection.execute("DELETE FROM touched_days")
+                self.connection.executemany("INSERT INTO touched_days VALUES (?, ?)", sorted(touched))
+                for table in ("daily_stats", "daily_histogram"):
+                    self.connection.execute(
+                        f"DELETE FROM {table} WHERE category = ? AND (website, scraping_date) IN (SELECT website, scraping_date FROM touched_days)",
+                        (category,),
+                    )
+                rows = pd.read_sql_query(
+                    """SELECT prices.website, prices.scraping_date, prices.price FROM touched_days
+                       JOIN prices ON prices.category = ? AND prices.website = touched_days.website AND prices.scraping_date = touched_days.scraping_date""",
+                    self.connection, params=[category],
+                )
+
+            days = rows.groupby(["website", "scraping_date"])["price"]
+            stats = days.agg(["count", "sum", "min", "max"])
+            stats["sum_sq"] = (rows["price"] ** 2).groupby([rows["website"], rows["scraping_date"]]).sum()
+            quantiles = days.quantile([0.25, 0.5, 0.75]).unstack()
+            self.connection.executemany(
+                "INSERT INTO daily_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (category, website, date, int(row["count"]), row["sum"], row["sum_sq"], row["min"], *quantiles.loc[(website, date)], row["max"])
+                    for (website, date), row in stats.iterrows()
+                ],
+            )
+
+            bins = (rows["price"] // HISTOGRAM_BIN_WIDTH).astype(int)
+            histogram = rows.groupby(["website", "scraping_date", bins.rename("bin")]).size()
+            self.connection.executemany(
+                "INSERT INTO daily_histogram VALUES (?, ?, ?, ?, ?)",
+                [(category, website, date, int(bin), int(listings)) for (website, date, bin), listings in histogram.items()],
+            )
+
+    def daily_stats(self, category: str, website: str = None, start: str = None, end: str = None) -> pd.DataFrame:
+        """Number of listings, mean, standard deviation, minimum, quartiles and maximum price of each day and site."""
+        df = self._select("daily_stats", category, dict(website=website, start=start, end=end))
+        df["mean_price"] = df["price_sum"] / df["listings"]
+        df["std_price"] = variance(df["listings"], df["price_sum"], df["price_sum_sq"]) ** 0.5
+        return df[["website", "scraping_date", "listings", "mean_price", "std_price", "min_price", "q25_price", "median_price", "q75_price", "max_price"]]
+
+    def histogram(self, category: str, website: str = None, start: str = None, end: str = None) -> pd.DataFrame:
+        """Listings per site in each price bin of HISTOGRAM_BIN_WIDTH, `price` is the middle of the bin."""
+        df = self._select("daily_histogram", category, dict(website=website, start=start, end=end))
+        df = df.groupby(["website", "bin"], as_index=False)["listings"].sum()
+        df["price"] = (df["bin"] + 0.5) * HISTOGRAM_BIN_WIDTH
+        return df[["website", "price", "listings"]]
+
+    def site_summary(self, category: str, start: str = None, end: str = None) -> pd.DataFrame:
+        """Same table as groupby("website")["price"].describe() on the cleaned rows, from the daily aggregates.
+
+        Quartiles are interpolated in the histogram bins, so they are within HISTOGRAM_BIN_WIDTH of the exact ones.
+        """
+        stats = self._select("daily_stats", category, dict(start=start, end=end)).groupby("website").agg(
+            count=("listings", "sum"), price_sum=("price_sum", "sum"), price_sum_sq=("price_sum_sq", "sum"),
+            min=("min_price", "min"), max=("max_price", "max"),
+        )
+        stats["mean"] = stats["price_sum"] / stats["count"]
+        stats["std"] = variance(stats["count"], stats["price_sum"], stats["price_sum_sq"]) ** 0.5
+        histogram = self.histogram(category, start=start, end=end)
+        for q, column in ((0.25, "25%"), (0.5, "50%"), (0.75, "75%")):
+            stats[column] = [
+                histogram_quantile(histogram[histogram["website"] == website], q, stats.at[website, "min"], stats.at[website, "max"])
+                for website in stats.index
+            ]
+        stats["count"] = stats["count"].astype(float)
+        return stats[["count", "mean", "std", "min", "25%", "50%", "75%", "max"]]
+
+    def _select(self, table: str, category: str, filters: dict) -> pd.DataFrame:
+        conditions, params = self._conditions(category, filters)
+        return pd.read_sql_query(f"SELECT * FROM {table} WHERE {' AND '.join(conditions)}", self.connection, params=params)
+
+    def _conditions(self, category: str, filters: dict) -> tuple:
+        conditions, params = ["category = ?"], [category]
+        for column, value in filters.items():
+            if value is None:
+                continue
+            if column == "start":
+                conditions.append("scraping_date >= ?")
+            elif column == "end":
+                conditions.append("scraping_date <= ?")
+            else:
+                conditions.append(f"{column} = ?")
+            params.append(value)
+        return conditions, params
+
+    def _query(self, select: str, category: str, group_by: str, filters: dict) -> pd.DataFrame:
+        conditions, params = self._conditions(category, filters)
+        sql = f"SELECT {select} FROM prices WHERE {' AND '.join(conditions)} GROUP BY {group_by} ORDER BY {group_by}"
+        return pd.read_sql_query(sql, self.connection, params=params)
+
+    def price_trend(self, category: str, website: str = None, brand: str = None, model: str = None, product_id: str = None, start: str = None, end: str = None) -> pd.DataFrame:
+        """Average and minimum price of each day and site, dates as YYYY-MM-DD."""
+        return self._query(
+            "scraping_date, website, COUNT(*) AS listings, AVG(price) AS mean_price, MIN(price) AS min_price",
+            category, "scraping_date, website",
+            dict(website=website, brand=brand, model=model, product_id=product_id, start=start, end=end),
+        )
+
+    def site_averages(self, category: str, brand: str = None, product_id: str = None, start: str = None, end: str = None) -> pd.DataFrame:
+        """Number of listings and average, minimum and maximum price of each site."""
+        return self._query(
+            "website, COUNT(*) AS listings, AVG(price) AS mean_price, MIN(price) AS min_price, MAX(price) AS max_price",
+            category, "website",
+            dict(brand=brand, product_id=product_id, start=start, end=end),
+        )
+
+    def min_price_per_day(self, category: str, product_id: str = None, brand: str = None, model: str = None, website: str = None, start: str = None, end: str = None) -> pd.DataFrame:
+        """Lowest price of each day and the site offering it."""
+        # with MIN(), SQLite takes the other columns from the row holding the minimum
+        return self._query(
+            "scraping_date, MIN(price) AS min_price, website, brand, model",
+            category, "scraping_date",
+            dict(product_id=product_id, brand=brand, model=model, website=website, start=start, end=end),
+        )
+
+    def close(self):
+        if self._changed:
+            # statistics of the indexes, lets SQLite skip-scan prices_by_listing when no website is given
+            self.connection.execute("ANALYZE")
+        self.connection.close()
+
+
+def variance(count: pd.Series, total: pd.Series, total_sq: pd.Series) -> pd.Series:
+    # sample variance from the sums, like pandas' std (ddof=1)
+    return ((total_sq - total ** 2 / count) / (count - 1)).clip(lower=0)
+
+
+def histogram_quantile(histogram: pd.DataFrame, q: float, low: float, high: float) -> float:
+    # linear interpolation inside the bin holding the quantile, kept within the exact min and max
+    histogram = histogram.sort_values("price")
+    target = q * histogram["listings"].sum()
+    before = histogram["listings"].cumsum() - histogram["listings"]
+    row = histogram[histogram["listings"].cumsum() >= target].iloc[0]
+    start = row["price"] - HISTOGRAM_BIN_WIDTH / 2
+    value = start + (target - before[row.name]) / row["listings"] * HISTOGRAM_BIN_WIDTH
+    return min(max(value, low), high)
@@ -0,0 +1,104 @@
+import hashlib
+import re
+import pandas as pd
+
+# columns naming a device, the same device sold on several sites gets the same product id
+PRODUCT_COLUMNS = ["brand", "model", "ram", "storage"]
+
+# capacities and network generations are not part of the name of the device
+NOISE_PATTERN = re.compile(r"\d+\s*(?:gb|tb)\b|\b[345]g\b|\blte\b")
+TOKEN_PATTERN = re.compile(r"[a-z]+|\d+")
+NOISE_WORDS = {"with", "and", "the", "for", "new", "unlocked", "renewed", "refurbished", "ram", "rom", "storage"}
+
+
+def model_tokens(brand: str, model: str) -> list:
+    # words and numbers of the model, "iPhone13" and "iphone 13" give the same tokens
+    model = NOISE_PATTERN.sub(" ", str(model).lower())
+    brand_words = set(TOKEN_PATTERN.findall(str(brand).lower()))
+    return [token for token in TOKEN_PATTERN.findall(model) if token not in NOISE_WORDS and token not in brand_words]
+
+
+def trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(max(1, len(text) - 2))}
+
+
+class ProductIndex:
+    """Links the descriptions of the same device, from any site, to one canonical product id.
+
+    Products are only compared with the products sharing a block: same brand, RAM and storage and
+    one model token or pair of adjacent tokens. Blocks holding more than `max_block_size` products
+    (words like "galaxy") are not used to find candidates, so the number of comparisons grows with
+    the size of the catalog rather than its square. Two products are the same device when their
+    model numbers are the same and the character trigrams of their models are `threshold` similar
+    (Jaccard), linked products are merged with a union-find.
+    """
+
+    def __init__(self, threshold: float = 0.8, max_block_size: int = 200):
+        self.threshold = threshold
+        self.max_block_size = max_block_size
+        self.keys = []  # product number -> first (brand, model, ram, storage) added for it
+        self._numbers = {}  # normalized product -> product number
+        self._signatures = []  # product number -> (numbers of the model, trigrams of the model)
+        self._parents = []
+        self._blocks = {}
+
+    def add(self, brand: str, model: str, ram: str, storage: str) -> int:
+        """Adds a product to the index and links it to the known products naming the same device."""
+        tokens = model_tokens(brand, model)
+        normalized = (str(brand).lower(), "".join(tokens), ram, storage)
+        if normalized in self._numbers:
+            return self._numbers[normalized]
+
+        number = len(self.keys)
+        self.keys.append((brand, model, ram, storage))
+        self._numbers[normalized] = number
+        self._signatures.append((sorted(token for token in tokens if token.isdigit()), trigrams(normalized[1])))
+        self._parents.append(number)
+
+        candidates = set()
+        for block_token in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            block = self._blocks.setdefault((normalized[0], ram, storage, block_token), [])
+            if len(block) < self.max_block_size:
+                candidates.update(block)
+                block.append(number)
+
+        for other in candidates:
+            if self.is_same_device(number, other):
+                self._union(number, other)
+        return number
+
+    def is_same_device(self, a: int, b: int) -> bool:
+        (numbers_a, grams_a), (numbers_b, grams_b) = self._signatures[a], self._signatures[b]
+        return numbers_a == numbers_b and len(grams_a & grams_b) >= self.threshold * len(grams_a | grams_b)
+
+    def find(self, number: int) -> int:
+        while self._parents[number] != number:
+            self._parents[number] = self._parents[self._parents[number]]  # path halving
+            number = self._parents[number]
+        return number
+
+    def _union(self, a: int, b: int):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self._parents[max(a, b)] = min(a, b)
+
+    def product_ids(self) -> list:
+        """Product id of every product number, named after the smallest product of its group so it
+        does not depend on the order the products were added in."""
+        groups = {}
+        for number, key in enumerate(self.keys):
+            groups.setdefault(self.find(number), []).append(key)
+        names = {root: hashlib.sha1("|".join(map(str, min(keys))).encode()).hexdigest()[:12] for root, keys in groups.items()}
+        return [names[self.find(number)] for number in range(len(self.keys))]
+
+
+def product_ids(df: pd.DataFrame, index: ProductIndex = None) -> pd.DataFrame:
+    """Product id of every distinct product of the cleaned rows, products without a brand or model are left out."""
+    index = index or ProductIndex()
+    products = df[PRODUCT_COLUMNS].astype(object).drop_duplicates()
+    products = products[products["brand"].notna() & products["model"].notna() & ~products["model"].isin(["nan", ""])]
+    products = products.sort_values(PRODUCT_COLUMNS, ignore_index=True)
+    numbers = [index.add(*product) for product in products.itertuples(index=False, name=None)]
+    ids = index.product_ids()
+    products["product_id"] = [ids[number] for number in numbers]
+    return products
@@ -0,0 +1,113 @@
+import random
+import threading
+import time
+from scraping_scripts.metrics import metrics
+
+# statuses meaning the site blocks the proxy's address
+BAN_STATUS_CODES = {403, 407, 429}
+
+
+class ProxyHealth:
+    def __init__(self, success_rate: float = 1.0, latency: float = None):
+        self.success_rate = success_rate  # EWMA of the successful requests
+        self.latency = latency  # EWMA of the response time of the successful requests, in seconds
+        self.failures = 0  # consecutive failures
+        self.quarantines = 0  # consecutive quarantines, each one twice as long as the one before
+        self.quarantined_until = 0.0
+        self.probing = False
+
+
+class ProxyPool:
+    """Health of every proxy, shared by the scrapers, to send each request through a proxy that works.
+
+    Each proxy has an EWMA of its success rate and of its latency, a request picks a proxy at random
+    weighted by success rate / latency, so fast healthy proxies get most of the traffic and new ones
+    still get tried. A ban (403, 407, 429) or `failure_threshold` failures in a row quarantine a proxy
+    for `quarantine` seconds, doubled on each new quarantine up to `max_quarantine`. Once its time is
+    up, a single request probes it: a success puts it back in the pool, a failure sends it back to
+    quarantine.
+    """
+
+    def __init__(self, alpha: float = 0.2, failure_threshold: int = 3, quarantine: float = 60, max_quarantine: float = 900):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.quarantine = quarantine
+        self.max_quarantine = max_quarantine
+        self._health = {}
+        self._lock = threading.Lock()
+
+    def _get(self, proxy: str) -> ProxyHealth:
+        if proxy not in self._health:
+            self._health[proxy] = ProxyHealth()
+        return self._health[proxy]
+
+    def _weight(self, health: ProxyHealth, default_latency: float) -> float:
+        return health.success_rate / max(health.latency or default_latency, 0.05)
+
+    def choose(self, proxies: list, exclude: list = ()) -> str:
+        """A proxy of the list, weighted by its health, other than the ones in `exclude` when possible."""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [proxy for proxy in proxies if proxy not in exclude] or list(proxies)
+            health = {proxy: self._get(proxy) for proxy in candidates}
+
+            # a proxy back from quarantine gets a single probing request at a time
+            usable = [proxy for proxy in candidates if health[proxy].quarantined_until <= now and not health[proxy].probing]
+            if not usable:
+                # every proxy is quarantined, use the one coming back first rather than waiting
+                return min(candidates, key=lambda proxy: health[proxy].quarantined_until)
+
+            latencies = [health[proxy].latency for proxy in usable if health[proxy].latency is not None]
+            default_latency = sorted(latencies)[len(latencies) // 2] if latencies else 1.0
+            proxy = random.choices(usable, weights=[self._weight(health[proxy], default_latency) for proxy in usable])[0]
+            if health[proxy].quarantines:
+                health[proxy].probing = True
+            return proxy
+
+    def record(self, proxy: str, status_code: int = None, latency: float = None, error: Exception = None):
+        """Updates the health of a proxy with the outcome of a request: a status code, or the error raised."""
+        if proxy is None:
+            return
+        banned = status_code in BAN_STATUS_CODES
+        ok = error is None and not banned and (status_code is None or status_code < 500)
+        with self._lock:
+            health = self._get(proxy)
+            health.probing = False
+            health.success_rate += self.alpha * ((1.0 if ok else 0.0) - health.success_rate)
+            if ok:
+                if latency is not None:
+                    health.latency = latency if health.latency is None else health.latency + self.alpha * (latency - health.latency)
+                health.failures = 0
+                health.quarantines = 0
+                return
+            health.failures += 1
+            if banned or health.failures >= self.failure_threshold or health.quarantines:
+                self._quarantine(proxy, health)
+
+    def release(self, proxy: str):
+        """Ends the probe of a proxy whose request ended without an outcome, the next request probes it again."""
+        if proxy is None:
+            return
+        with self._lock:
+            if proxy in self._health:
+                self._health[proxy].probing = False
+
+    def _quarantine(self, proxy: str, health: ProxyHealth):
+        duration = min(self.max_quarantine, self.quarantine * 2 ** health.quarantines)
+        health.quarantined_until = time.monotonic() + duration
+        health.quarantines += 1
+        health.failures = 0
+        metrics.count("proxy_quarantines_total", proxy=proxy)
+
+    def snapshot(self) -> dict:
+        """Success rate, latency and remaining quarantine of every proxy seen so far."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                proxy: {
+                    "success_rate": health.success_rate,
+                    "latency": health.latency,
+                    "quarantined_for": max(0.0, health.quarantined_until - now),
+                }
+                for proxy, health in self._health.items()
+            }
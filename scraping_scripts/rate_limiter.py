@@ -0,0 +1,76 @@
+import random
+import threading
+import time
+
+# statuses meaning the site wants us to slow down
+THROTTLE_STATUS_CODES = {429, 503}
+
+
+def backoff_delay(failures: int, base: float = 1, cap: float = 60) -> float:
+    # exponential backoff with full jitter
+    return random.uniform(0, min(cap, base * 2 ** failures))
+
+
+class HostBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.failures = 0
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class RateLimiter:
+    """Token bucket per host whose rate adapts AIMD style to the responses of the host.
+
+    Every successful response adds `increase` requests/second to the host's rate, every
+    throttling response (429, 503 or a timeout) multiplies it by `decrease` and pauses the
+    host for an exponential, jittered backoff.
+    """
+
+    def __init__(self, initial_rate: float = 0.5, min_rate: float = 0.05, max_rate: float = 5, increase: float = 0.05, decrease: float = 0.5, burst: float = 2):
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host: str) -> HostBucket:
+        if host not in self._buckets:
+            self._buckets[host] = HostBucket(self.initial_rate, self.burst)
+        return self._buckets[host]
+
+    def acquire(self, host: str):
+        # blocks until the host allows one more request
+        with self._lock:
+            bucket = self._bucket(host)
+            now = time.monotonic()
+            bucket.refill(now)
+            bucket.tokens -= 1
+            wait = max(-bucket.tokens / bucket.rate, bucket.blocked_until - now, 0)
+        if wait > 0:
+            time.sleep(wait)
+
+    def record(self, host: str, status_code: int = None, timed_out: bool = False, retry_after: float = None):
+        with self._lock:
+            bucket = self._bucket(host)
+            if timed_out or status_code in THROTTLE_STATUS_CODES:
+                bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+                bucket.failures += 1
+                pause = retry_after if retry_after is not None else backoff_delay(bucket.failures)
+                bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + pause)
+            elif status_code is not None and status_code < 400:
+                bucket.rate = min(self.max_rate, bucket.rate + self.increase)
+                bucket.failures = 0
+
+    def current_rate(self, host: str) -> float:
+        with self._lock:
+            return self._bucket(host).rate
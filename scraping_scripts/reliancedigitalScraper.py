@@ -1,18 +1,65 @@
 from selenium import webdriver
-from bs4 import BeautifulSoup
-import random
-import time
-from concurrent.futures import ThreadPoolExecutor
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from concurrent.futures import Future
 from datetime import datetime
 import logging
 from dotenv import load_dotenv
 import os
+import re
+from urllib.parse import urlparse
 from scraping_scripts.headers import headers
-from scraping_scripts.utils import load_visited_urls, save_to_csv, save_visted_url, get_with_retries
+from scraping_scripts.parsers import parse_html
+from scraping_scripts.utils import REPLAY, get_crawl_frontier, get_response_cache, get_with_retries, save_data, sink, rate_limiter, log_errors
+from scraping_scripts.fetcher import fetch_all
+from scraping_scripts.pagination import ListingPages, page_urls
+from scraping_scripts.parse_pool import submit_parse
+from scraping_scripts.driver_pool import DriverPool
+from scraping_scripts.scheduler import Crawl, exhaust, scrape_all
+
+# errors of the site, written to logs/reliancedigital_scraping_errors.log by log_errors
+logger = logging.getLogger("reliancedigital")
+
+# number of product pages fetched at the same time
+MAX_CONCURRENCY = 8
+
+# seconds to wait for a listing page to render, and for a free browser
+PAGE_LOAD_TIMEOUT = 15
+DRIVER_WAIT_TIMEOUT = 300
+
+# product links of the listing pages are relative to the site
+BASE_URL = "https://www.reliancedigital.in"
+
+TARGETS = [
+    {
+        "category": "smartphones",
+        "url": "https://www.reliancedigital.in/smartphones/c/S101711?searchQuery=:relevance&page=0",
+        "max_pages": 9,
+        "listing_mode": "http",  # "http" reads the listing without a browser, "selenium" renders it in chrome
+    },
+    {
+        "category": "laptops",
+        "url": "https://www.reliancedigital.in/laptops/c/S101210?searchQuery=:relevance:availability:Exclude%20out%20of%20Stock&page=0",
+        "max_pages": 9,
+        "listing_mode": "http",
+    },
+    {
+        "category": "tablets",
+        "url": "https://www.reliancedigital.in/tablets/c/S101712?searchQuery=:relevance&page=0",
+        "max_pages": 9,
+        "listing_mode": "http",
+    }
+]
+
+# product page paths (/<product name>/p/<product id>) as they appear in the state embedded in listing pages
+PRODUCT_PATH_PATTERN = re.compile(r'"(/[\w\-.%]+/p/\d+)"')
+
 
 # extracts a single product data and saves it
 def extract_data(html: str, category: str, data: list):
-    soup = BeautifulSoup(html, "html.parser")
+    soup = parse_html(html)
 
     rows = soup.select("#pdp__specification > section > ul > div")
 
@@ -57,139 +104,194 @@ def extract_data(html: str, category: str, data: list):
     })
 
 
-def scrape_data(driver: object, url: str, category: str, proxies: list, max_pages: int, processed_categories: set) -> bool:
+def new_driver() -> object:
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    return webdriver.Chrome(options=options)
+
+
+# browsers are only started when a listing page needs one, then reused across categories
+driver_pool = DriverPool(
+    new_driver,
+    max_size=int(os.getenv("SELENIUM_MAX_DRIVERS", 2)),
+    max_pages=int(os.getenv("SELENIUM_MAX_PAGES_PER_DRIVER", 50)),
+    max_memory_mb=float(os.getenv("SELENIUM_MAX_MEMORY_MB", 1024)),
+)
+
+
+def extract_product_links(html: str) -> list:
+    # product links of a listing page, read from the rendered list or from the page state embedded in the html
+    soup = parse_html(html)
+    hrefs = [product_link.get("href") for product_link in soup.select(".pl__container > ul > li > div > a") if product_link.get("href")]
+    if not hrefs:
+        hrefs = PRODUCT_PATH_PATTERN.findall(html.replace("\\u002F", "/").replace("\\/", "/"))
+    return list(dict.fromkeys(href.strip() for href in hrefs))
+
+
+def render_listing_page(url: str) -> str:
+    # rendered pages are cached under their own key, next to the html of the same url, for the offline replays
+    response_cache = get_response_cache()
+    rendered_url = f"{url}#rendered"
+    if REPLAY:
+        cached = response_cache.lookup(rendered_url) if response_cache else None
+        response = response_cache.response(cached) if cached is not None else None
+        if response is None:
+            raise Exception(f"{url} was never rendered in the browser, it is not in the response cache (HTTP_CACHE_OFFLINE=1).")
+        return response.text
+    html = render_in_browser(url)
+    if response_cache:
+        response_cache.store_body(rendered_url, html.encode("utf-8"), {"Content-Type": "text/html; charset=utf-8"})
+    return html
+
+
+def render_in_browser(url: str) -> str:
+    with driver_pool.driver(timeout=DRIVER_WAIT_TIMEOUT) as driver:
+        rate_limiter.acquire(urlparse(url).netloc)
+        driver.get(url)
+        try:
+            # wait for the products to render
+            WebDriverWait(driver, PAGE_LOAD_TIMEOUT).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, ".pl__container > ul > li"))
+            )
+        except TimeoutException:
+            pass  # empty listing, the links are looked up in the page state instead
+        return driver.page_source
+
+
+def scrape_pages(url: str, category: str, proxies: list, max_pages: int, processed_categories: set, listing_mode: str = "http", base_url: str = BASE_URL):
+    """Scrapes the listing pages of a category and their products, one page per step, returns True on an error."""
+    crawl_frontier = get_crawl_frontier()
     data = []
     is_error = False
+    modes = {"listing": listing_mode}
+
+    def fetch_product_paths(page_number, page_url):
+        # product paths of a listing page, read from its html or rendered in the browser, none past the last page
+        if modes["listing"] == "http":
+            try:
+                response = get_with_retries(page_url, headers=headers, proxies=proxies, withProxy=True, site="reliancedigital")
+                product_paths = extract_product_links(response.text)
+                # once the first page settled the mode, a page read without products is past the end of the listing,
+                # unless another page switched to the browser in the meantime
+                if product_paths or (page_number > 0 and modes["listing"] == "http"):
+                    return product_paths
+            except Exception as e:
+                logger.error(f"{datetime.now()} : Failed to read listing page {page_url} without a browser: {e}")
+            if modes["listing"] == "http":
+                # the listing could not be read from the html, use the browser for the rest of the category
+                print(f"falling back to selenium for category {category} in reliance digital")
+                modes["listing"] = "selenium"
+        return extract_product_links(render_listing_page(page_url))
+
+    # the first page settles the listing mode (html or browser) before the next pages are fetched ahead with it
+    urls = page_urls(url, "page", 0, max_pages)
+    first_page = Future()
+    try:
+        first_page.set_result(fetch_product_paths(0, urls[0]))
+    except Exception as e:
+        first_page.set_exception(e)
+
+    def fetch_page(page_number, page_url):
+        return first_page.result() if page_number == 0 else fetch_product_paths(page_number, page_url)
+
+    pages = ListingPages(urls, fetch_page, site="reliancedigital")
     page_number = 0
-    visited_urls = load_visited_urls(file_path=f"cache/reliancedigital_visited_{category}_urls.txt")
 
-    base_url = "https://www.reliancedigital.in"
+    try:
+        for page_number, url, listing_page in pages:
+            try:
+                product_paths = listing_page.result()
+                if not product_paths:
+                    print(f"No products found on page {page_number} for {category} - {url=}")
+                    continue
 
-    while page_number < max_pages:
-        try:
-            driver.get(url)
-            time.sleep(5)
+                # skip the products already scraped by an interrupted run
+                links = crawl_frontier.add("reliancedigital", category, [f"{base_url}{path}" for path in product_paths])
+                crawl_frontier.start("reliancedigital", category, links)
 
-            soup = BeautifulSoup(driver.page_source, "html.parser")
+                # pages are parsed in the parser processes while the next ones are being fetched
+                parsed_pages = {}
 
-            products_links = soup.select(".pl__container > ul > li > div > a")
+                def handle_page(link, response):
+                    parsed_pages[link] = submit_parse("reliancedigital", response.text, category)
 
-            for product_link in products_links:
-                link = f"{base_url}{product_link.get('href').strip()}" if product_link.get("href") else None
-                # retry 5 times to get the product details
-                if link in visited_urls:
-                    continue
-                
                 headers["Referer"] = base_url  # Update Referer header
-                for _ in range(5):
+                failed = fetch_all(links, parse=handle_page, headers=headers, max_concurrency=MAX_CONCURRENCY, proxies=proxies, withProxy=True, site="reliancedigital")
+                scraped = []
+                for link, parsed_page in parsed_pages.items():
                     try:
-                        response = get_with_retries(url=link, headers=headers, proxies=proxies, withProxy=True)
-                        time.sleep(random.uniform(2, 4))
-                        visited_urls.add(link)
-                        extract_data(html=response.text, category=category, data=data)
-                        break
+                        data.extend(parsed_page.result())
+                        scraped.append(link)
                     except Exception as e:
-                        pass
-
-            save_to_csv(file_path=f"data/reliancedigital_{category}.csv", data=data, category=category, processed_categories=processed_categories)
-            save_visted_url(file_path=f"cache/reliancedigital_visited_{category}_urls.txt", visited_urls=visited_urls)
-            
-            # Move to the next page
-            page_number += 1
-            url = url.replace(f"&page={page_number-1}", f"&page={page_number}")
-        
-        except Exception as e:
-            save_to_csv(file_path=f"data/reliancedigital_{category}.csv", data=data, category=category, processed_categories=processed_categories)
-            save_visted_url(file_path=f"cache/reliancedigital_visited_{category}_urls.txt", visited_urls=visited_urls)
-            is_error = True
-            current_time = datetime.now()
-            print(f"Error while scraping reliancedigital, page {page_number} of {category}:")
-            print(e)
-            logging.error(f"{current_time} : Error on page {page_number} of {category}: {url}:")
-            logging.error(e)
-            break 
+                        crawl_frontier.fail("reliancedigital", category, link, e)
+
+                for link, error in failed:
+                    # products that could not be fetched are retried on the next run
+                    crawl_frontier.fail("reliancedigital", category, link, error)
+                    logger.error(f"{datetime.now()} : Failed to fetch {link}: {error}")
+
+                # a product is done once its rows are saved
+                save_data(site="reliancedigital", category=category, data=data, processed_categories=processed_categories)
+                crawl_frontier.done("reliancedigital", category, scraped)
+                yield page_number
+
+            except Exception as e:
+                is_error = True
+                current_time = datetime.now()
+                print(f"Error while scraping reliancedigital, page {page_number} of {category}:")
+                print(e)
+                logger.error(f"{current_time} : Error on page {page_number} of {category}: {url}:")
+                logger.error(e)
+                break
+    finally:
+        pages.close()
     
     return is_error
 
 
-def scrape_wrapper(target: dict, proxies: list, processed_categories: set) -> bool:
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless=new")
-    driver = webdriver.Chrome(options=options)
-
-    print(f"scraping data started for category '{target['category']}' in reliance digital")
-
-    error = scrape_data(
-        driver=driver, 
-        url=target["url"], 
-        category=target["category"], 
-        proxies=proxies, 
-        max_pages=target["max_pages"], 
-        processed_categories=processed_categories
-    )
-
-    driver.quit()
+def scrape_data(url: str, category: str, proxies: list, max_pages: int, processed_categories: set, listing_mode: str = "http", base_url: str = BASE_URL) -> bool:
+    return exhaust(scrape_pages(url, category, proxies, max_pages, processed_categories, listing_mode, base_url))
 
-    if error:
-        print(f"something went worng when scraping data for category {target['category']} in reliance digital, please check log and cache files")
-    else:
-        print(f"scraping data finished for category {target['category']} in reliance digital")
 
-    return error
-
-
-def main():
+def page_crawls() -> list:
+    """The crawl of every target, for the scheduler."""
     #Tracks categories to prevent redundant CSV headers.
     processed_categories = set()
 
-    errors = []
-
     load_dotenv()
 
     # Access environment variable
     proxies = os.getenv("PROXY_LIST").split(",")
 
-    logging.basicConfig(filename="logs/reliancedigital_scraping_errors.log", level=logging.ERROR)
-
-    targets = [
-        {
-            "category": "smartphones",
-            "url": "https://www.reliancedigital.in/smartphones/c/S101711?searchQuery=:relevance&page=0",
-            "max_pages": 9
-        },
-        {
-            "category": "laptops",
-            "url": "https://www.reliancedigital.in/laptops/c/S101210?searchQuery=:relevance:availability:Exclude%20out%20of%20Stock&page=0",
-            "max_pages": 9
-        },
-        {
-            "category": "tablets",
-            "url": "https://www.reliancedigital.in/tablets/c/S101712?searchQuery=:relevance&page=0",
-            "max_pages": 9
-        }
-    ]
+    # products left in flight by an interrupted run are scraped again
+    get_crawl_frontier().recover("reliancedigital")
 
-    for target in targets:
-        if os.path.exists(f"data/reliancedigital_{target['category']}.csv"): # if file exists:
-            with open(f"data/reliancedigital_{target['category']}.csv", mode="r") as file:
+    for target in TARGETS:
+        path = os.path.join(sink.base_dir, "data", f"reliancedigital_{target['category']}.csv")
+        if os.path.exists(path): # if file exists:
+            with open(path, mode="r") as file:
                 if file.read(1): # if file is not empty
                     # ensure that the headers are not written to the csv file as it is not empty
                     processed_categories.add(target["category"])
 
-    # Use ThreadPoolExecutor to run scraping in parallel
-    with ThreadPoolExecutor(max_workers=3) as executer:
-        futures = [executer.submit(scrape_wrapper, target, proxies, processed_categories) for target in targets]
-
-        for future in futures:
-            errors.append(future.result())
-        
-    # if no error, then the scraping finished successfully, truncate the cache/reliancedigital_visited_urls.txt
-    if not any(errors):
-        for target in targets:
-            cache_file = f"cache/reliancedigital_visited_{target['category']}_urls.txt"
-            if os.path.exists(cache_file):
-                os.remove(cache_file)
-    
+    return [
+        Crawl("reliancedigital", target["category"], target["max_pages"], scrape_pages(
+            url=target["url"],
+            category=target["category"],
+            proxies=proxies,
+            max_pages=target["max_pages"],
+            processed_categories=processed_categories,
+            listing_mode=target.get("listing_mode", "http"),
+        ))
+        for target in TARGETS
+    ]
+
+
+def main():
+    log_errors("reliancedigital")
+
+    scrape_all(page_crawls(), get_crawl_frontier())
+
     print("scraping data finished for reliance digital")
 
 
@@ -204,3 +306,4 @@ if __name__ == "__main__":
         os.mkdir("./logs")
 
     main()
+    driver_pool.close()
@@ -0,0 +1,155 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from scraping_scripts.pagination import FetchBudget
+
+# pages scraped at the same time over all the sites
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", 6))
+
+# pages of one site scraped at the same time, e.g. "ebay:3,flipkart:2,reliancedigital:3"
+SITE_LIMITS = {
+    site: int(limit)
+    for site, limit in (item.split(":") for item in os.getenv("SCHEDULER_SITE_LIMITS", "ebay:3,flipkart:3,reliancedigital:3").split(",") if item)
+}
+
+
+class Crawl:
+    """The listing pages of one category of a site.
+
+    `pages` is the site's page generator: every step scrapes one listing page (and its products)
+    and its return value says whether the crawl failed. Pages of a category are scraped in order,
+    each step is one job of the scheduler.
+    """
+
+    def __init__(self, site: str, category: str, max_pages: int, pages):
+        self.site = site
+        self.category = category
+        self.max_pages = max_pages
+        self.pages = pages
+        self.scraped = 0
+        self.error = None
+        self.finished = False
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def remaining(self) -> int:
+        return self.max_pages - self.scraped
+
+    def step(self):
+        # scrapes the next page, the crawl is finished after the last page or an error
+        try:
+            next(self.pages)
+            self.scraped += 1
+        except StopIteration as stop:
+            self.error = bool(stop.value)
+            self.finished = True
+        except Exception as e:
+            # the page generators catch their errors, this is a bug of the scraper
+            logging.getLogger(self.site).error(f"{datetime.now()} : {self.site} {self.category} stopped: {e}")
+            self.error = True
+            self.finished = True
+
+
+def exhaust(pages) -> bool:
+    """Scrapes every page of a page generator in the calling thread, returns its result."""
+    while True:
+        try:
+            next(pages)
+        except StopIteration as stop:
+            return stop.value
+
+
+class Scheduler:
+    """Runs the pages of every crawl on one pool of `workers` threads.
+
+    A free worker takes the waiting page of the category with the most pages left, from any site
+    whose number of pages in progress is under its limit, so the long categories start first and a
+    worker never waits on a slow site while another one has work. The listing pages the crawls fetch
+    ahead draw from the same budget: at most `workers` at a time, and at most the limit of their site.
+    """
+
+    def __init__(self, workers: int = SCHEDULER_WORKERS, site_limits: dict = None, default_site_limit: int = 3):
+        self.workers = workers
+        self.site_limits = SITE_LIMITS if site_limits is None else site_limits
+        self.default_site_limit = default_site_limit
+        self._condition = threading.Condition()
+        self._ready = []  # (-remaining pages, order, crawl)
+        self._running = {}  # site -> pages in progress
+        self._order = itertools.count()
+        self.fetch_budget = FetchBudget(workers, self.site_limits, default_site_limit)
+
+    def _limit(self, site: str) -> int:
+        return self.site_limits.get(site, self.default_site_limit)
+
+    def _push(self, crawl: Crawl):
+        heapq.heappush(self._ready, (-crawl.remaining, next(self._order), crawl))
+
+    def _take(self) -> Crawl:
+        # the waiting crawl with the most pages left among the sites under their limit, None once everything is done
+        with self._condition:
+            while True:
+                skipped = []
+                taken = None
+                while self._ready:
+                    entry = heapq.heappop(self._ready)
+                    if self._running.get(entry[2].site, 0) < self._limit(entry[2].site):
+                        taken = entry[2]
+                        break
+                    skipped.append(entry)
+                for entry in skipped:
+                    heapq.heappush(self._ready, entry)
+                if taken is not None:
+                    self._running[taken.site] = self._running.get(taken.site, 0) + 1
+                    return taken
+                if not self._ready and not any(self._running.values()):
+                    return None
+                self._condition.wait()
+
+    def _work(self):
+        while True:
+            crawl = self._take()
+            if crawl is None:
+                return
+            if crawl.started_at is None:
+                crawl.started_at = time.monotonic()
+            with self.fetch_budget.current():
+                crawl.step()
+            with self._condition:
+                self._running[crawl.site] -= 1
+                if crawl.finished:
+                    crawl.finished_at = time.monotonic()
+                else:
+                    self._push(crawl)
+                self._condition.notify_all()
+
+    def run(self, crawls: list) -> list:
+        """Scrapes every page of the crawls, returns them once they are all finished."""
+        with self._condition:
+            for crawl in crawls:
+                self._push(crawl)
+        threads = [threading.Thread(target=self._work, name=f"scheduler-{i}") for i in range(max(1, self.workers))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return crawls
+
+
+def scrape_all(crawls: list, crawl_frontier, scheduler: Scheduler = None) -> bool:
+    """Runs the crawls, forgets the crawl state of the categories that finished without an error.
+
+    Returns True if a category failed.
+    """
+    for crawl in (scheduler or Scheduler()).run(crawls):
+        if crawl.error:
+            print(f"something went worng when scraping data for category {crawl.category} in {crawl.site}, please check log and cache files")
+        else:
+            crawl_frontier.finish(crawl.site, crawl.category)
+            print(f"scraping data finished for category {crawl.category} in {crawl.site} "
+                  f"({crawl.scraped} pages in {crawl.finished_at - crawl.started_at:.1f}s)")
+    return any(crawl.error for crawl in crawls)
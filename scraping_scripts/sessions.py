@@ -0,0 +1,44 @@
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class SessionPool:
+    # Keeps one keep-alive requests.Session per (site, proxy endpoint) so TCP, TLS and proxy CONNECT are reused
+    def __init__(self, pool_size: int = 10, idle_timeout: float = 300):
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self._sessions = {}  # (site, proxy endpoint) -> [session, last used]
+        self._lock = threading.Lock()
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def get(self, site: str, proxy_endpoint: str = None) -> requests.Session:
+        key = (site, proxy_endpoint)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.get(key)
+            if entry is None:
+                entry = self._sessions[key] = [self._new_session(), now]
+            entry[1] = now
+            return entry[0]
+
+    def _evict_idle(self, now: float):
+        for key, (session, last_used) in list(self._sessions.items()):
+            if now - last_used > self.idle_timeout:
+                session.close()
+                del self._sessions[key]
+
+    def close(self):
+        with self._lock:
+            for session, _ in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
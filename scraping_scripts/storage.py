@@ -0,0 +1,212 @@
+import glob
+import io
+import os
+import uuid
+import numpy as np
+import pandas as pd
+
+RAW_DATA_DIR = "data"
+CLEANED_DATA_DIR = "cleaned_data"
+
+COLUMNS = ["brand", "model", "processor", "ram", "storage", "price", "website", "category", "scraping_date", "promotion"]
+PARTITION_COLUMNS = ["website", "category", "scraping_date"]
+
+
+class CsvSink:
+    # Appends the rows of each site and category to data/<site>_<category>.csv
+    name = "csv"
+
+    def __init__(self, base_dir: str = "."):
+        self.base_dir = base_dir
+
+    def path(self, site: str, category: str) -> str:
+        return os.path.join(self.base_dir, RAW_DATA_DIR, f"{site}_{category}.csv")
+
+    def write(self, site: str, category: str, rows: list, processed_categories: set) -> int:
+        # returns the number of bytes written
+        df = pd.DataFrame(rows)
+        path = self.path(site, category)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        category_not_in_processed_categories = category not in processed_categories
+        df.to_csv(path, index=False, mode="a", header=category_not_in_processed_categories)
+        if category_not_in_processed_categories:
+            processed_categories.add(category) # ensure headers are only written once
+        return os.path.getsize(path) - size
+
+    def read(self, site: str, category: str, columns: list = None) -> pd.DataFrame:
+        return pd.read_csv(self.path(site, category), usecols=columns)
+
+    def read_since(self, site: str, category: str, watermark: dict = None) -> tuple:
+        # rows appended after the byte offset of the watermark, and the new watermark
+        path = self.path(site, category)
+        offset = (watermark or {}).get("offset", 0)
+        with open(path, "rb") as file:
+            header = file.readline()
+            if offset > os.path.getsize(path):
+                offset = 0  # the file was replaced, read it again from the start
+            file.seek(max(offset, len(header)))
+            content = file.read()
+        # a row still being written by a scraper is left for the next run
+        content = content[:content.rfind(b"\n") + 1]
+        # read as strings like read_chunks, a delta without any RAM or storage value still has string columns
+        df = pd.read_csv(io.BytesIO(header + content), dtype=str)
+        return df, {"offset": max(offset, len(header)) + len(content)}
+
+    def read_chunks(self, site: str, category: str, chunksize: int, columns: list = None):
+        # values are read as strings, so the types of a chunk do not depend on the rows it happens to hold
+        yield from pd.read_csv(self.path(site, category), usecols=columns, chunksize=chunksize, dtype=str)
+
+
+class ParquetSink:
+    # Writes typed row groups to a dataset partitioned by site, category and scraping date:
+    # data/parquet/website=<site>/category=<category>/scraping_date=<date>/part-<id>.parquet
+    name = "parquet"
+
+    def __init__(self, base_dir: str = ".", row_group_size: int = 10_000):
+        import pyarrow as pa  # optional dependency, only needed for this sink
+
+        self.base_dir = base_dir
+        self.row_group_size = row_group_size
+        self.schema = pa.schema(
+            [(column, pa.date32() if column == "scraping_date" else pa.string()) for column in COLUMNS]
+        )
+
+    @property
+    def root(self) -> str:
+        return os.path.join(self.base_dir, RAW_DATA_DIR, "parquet")
+
+    def write(self, site: str, category: str, rows: list, processed_categories: set = None) -> int:
+        # returns the number of bytes written
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pylist([{column: row.get(column) for column in COLUMNS} for row in rows], schema=self.schema)
+        written = []
+        pq.write_to_dataset(
+            table,
+            root_path=self.root,
+            partition_cols=PARTITION_COLUMNS,
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            row_group_size=self.row_group_size,
+            file_visitor=lambda file: written.append(file.path),
+        )
+        return sum(os.path.getsize(path) for path in written)
+
+    def read(self, site: str, category: str, columns: list = None) -> pd.DataFrame:
+        df = pd.read_parquet(
+            self.root,
+            columns=columns,
+            filters=[("website", "==", site), ("category", "==", category)],
+        )
+        return self._as_csv_frame(df)
+
+    def read_since(self, site: str, category: str, watermark: dict = None) -> tuple:
+        # rows of the part files written after the watermark, and the new watermark
+        processed = set((watermark or {}).get("files", []))
+        pattern = os.path.join(self.root, f"website={site}", f"category={category}", "*", "*.parquet")
+        files = sorted(path for path in glob.glob(pattern) if os.path.relpath(path, self.root) not in processed)
+        frames = []
+        for path in files:
+            df = pd.read_parquet(path)
+            df["website"] = site
+            df["category"] = category
+            df["scraping_date"] = os.path.basename(os.path.dirname(path)).split("=", 1)[1]
+            frames.append(df)
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=COLUMNS)
+        processed.update(os.path.relpath(path, self.root) for path in files)
+        return self._as_csv_frame(df), {"files": sorted(processed)}
+
+    def read_chunks(self, site: str, category: str, chunksize: int, columns: list = None):
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(self.root, format="parquet", partitioning="hive")
+        scanner = dataset.scanner(
+            columns=columns,
+            filter=(ds.field("website") == site) & (ds.field("category") == category),
+            batch_size=chunksize,
+        )
+        for batch in scanner.to_batches():
+            if batch.num_rows:
+                yield self._as_csv_frame(batch.to_pandas())
+
+    def _as_csv_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        # partition columns come back as categories, keep the same dtypes as the csv sink
+        for column in df.columns.intersection(PARTITION_COLUMNS):
+            df[column] = df[column].astype(str)
+        # strings with missing values as NaN, the way read_csv(dtype=str) returns them, even for a column without any value
+        for column in df.columns.difference(PARTITION_COLUMNS):
+            df[column] = df[column].astype(object).where(df[column].notna(), np.nan)
+        return df[[column for column in COLUMNS if column in df.columns]]
+
+
+SINKS = {"csv": CsvSink, "parquet": ParquetSink}
+
+
+def get_sink(name: str = None, base_dir: str = ".") -> object:
+    """Returns the storage sink configured by STORAGE_SINK (csv by default)."""
+    return SINKS[name or os.getenv("STORAGE_SINK", "csv")](base_dir=base_dir)
+
+
+def read_raw(site: str, category: str, columns: list = None, base_dir: str = ".", sink: str = None) -> pd.DataFrame:
+    """Reads the raw scraped rows of a site and category, only loading the requested columns."""
+    return get_sink(sink, base_dir).read(site, category, columns=columns)
+
+
+def read_raw_since(site: str, category: str, watermark: dict = None, base_dir: str = ".", sink: str = None) -> tuple:
+    """Reads the raw rows scraped since the watermark of a previous read, returns them with the new watermark."""
+    return get_sink(sink, base_dir).read_since(site, category, watermark)
+
+
+def read_raw_chunks(site: str, category: str, chunksize: int, columns: list = None, base_dir: str = ".", sink: str = None):
+    """Reads the raw scraped rows of a site and category as frames of at most `chunksize` rows."""
+    return get_sink(sink, base_dir).read_chunks(site, category, chunksize, columns=columns)
+
+
+def cleaned_exists(category: str, base_dir: str = ".", sink: str = None) -> bool:
+    extension = "parquet" if (sink or os.getenv("STORAGE_SINK", "csv")) == "parquet" else "csv"
+    return os.path.exists(os.path.join(base_dir, CLEANED_DATA_DIR, f"{category}.{extension}"))
+
+
+def write_cleaned(category: str, frames, base_dir: str = ".", sink: str = None):
+    """Saves the cleaned rows of a category, one frame after the other, so they never need to be in memory together."""
+    if (sink or os.getenv("STORAGE_SINK", "csv")) == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        for df in frames:
+            if writer is None:
+                schema = pa.schema([(column, pa.float64() if column == "price" else pa.string()) for column in df.columns])
+                writer = pq.ParquetWriter(os.path.join(base_dir, CLEANED_DATA_DIR, f"{category}.parquet"), schema)
+            # categorical columns are saved as plain strings
+            df = df.astype({column: object for column in df.columns if column != "price"})
+            writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+        if writer is not None:
+            writer.close()
+    else:
+        path = os.path.join(base_dir, CLEANED_DATA_DIR, f"{category}.csv")
+        for i, df in enumerate(frames):
+            df.to_csv(path, index=False, mode="w" if i == 0 else "a", header=i == 0)
+
+
+def read_cleaned(category: str, columns: list = None, base_dir: str = ".", sink: str = None) -> pd.DataFrame:
+    """Reads the cleaned rows of a category, only loading the requested columns."""
+    if (sink or os.getenv("STORAGE_SINK", "csv")) == "parquet":
+        return pd.read_parquet(os.path.join(base_dir, CLEANED_DATA_DIR, f"{category}.parquet"), columns=columns)
+    return pd.read_csv(os.path.join(base_dir, CLEANED_DATA_DIR, f"{category}.csv"), usecols=columns)
+
+
+def write_products(category: str, df: pd.DataFrame, base_dir: str = ".", sink: str = None):
+    """Saves the product ids of a category next to its cleaned rows, in cleaned_data/<category>_products."""
+    if (sink or os.getenv("STORAGE_SINK", "csv")) == "parquet":
+        df.to_parquet(os.path.join(base_dir, CLEANED_DATA_DIR, f"{category}_products.parquet"), index=False)
+    else:
+        df.to_csv(os.path.join(base_dir, CLEANED_DATA_DIR, f"{category}_products.csv"), index=False)
+
+
+def read_products(category: str, base_dir: str = ".", sink: str = None) -> pd.DataFrame:
+    """Reads the product ids of a category, join them to the cleaned rows on brand, model, ram and storage."""
+    if (sink or os.getenv("STORAGE_SINK", "csv")) == "parquet":
+        return pd.read_parquet(os.path.join(base_dir, CLEANED_DATA_DIR, f"{category}_products.parquet"))
+    return pd.read_csv(os.path.join(base_dir, CLEANED_DATA_DIR, f"{category}_products.csv"))
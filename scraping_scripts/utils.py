@@ -1,67 +1,209 @@
 import requests
 from dotenv import load_dotenv
+from functools import lru_cache
+import logging
 import os
+import threading
 import time
-import random
-import pandas as pd
-
-def get_with_retries(url: str, headers: dict, proxies: list = [], withProxy: bool = True, retries: int = 5, delay: int = 5):
-    proxy = {}
-    if withProxy:
-        load_dotenv()
-
-        if len(proxies) > 0:
-            proxy_username = os.getenv("PROXY_USERNAME_RELIANCE_DIGITAL")
-            proxy_password = os.getenv("PROXY_PASSWORD_RELIANCE_DIGITAL")
-            proxy_address = random.choice(proxies)
-        else:
-            rotating_proxy_domain_name = os.getenv("ROTATING_PROXY_DOMAINE_NAME_EBAY")
-            rotating_proxy_port = os.getenv("ROTATING_PROXY_PORT_EBAY")
-            proxy_address = f"{rotating_proxy_domain_name}:{rotating_proxy_port}"
-            proxy_username = os.getenv("ROTATING_PROXY_USERNAME_EBAY")
-            proxy_password = os.getenv("ROTATING_PROXY_PASSWORD_EBAY")
-
-        proxy = {
-            "http": f"http://{proxy_username}:{proxy_password}@{proxy_address}",
-            "https": f"http://{proxy_username}:{proxy_password}@{proxy_address}"
-        }
+from urllib.parse import urlparse
+from scraping_scripts.crawl_frontier import CrawlFrontier
+from scraping_scripts.http_cache import ResponseCache
+from scraping_scripts.metrics import metrics, stage
+from scraping_scripts.proxy_pool import ProxyPool
+from scraping_scripts.sessions import SessionPool
+from scraping_scripts.rate_limiter import RateLimiter, backoff_delay
+from scraping_scripts.storage import get_sink
+
+load_dotenv()
+
+# persistent connections shared by all the scrapers, keyed by (site, proxy endpoint)
+session_pool = SessionPool(
+    pool_size=int(os.getenv("HTTP_POOL_SIZE", 10)),
+    idle_timeout=float(os.getenv("HTTP_POOL_IDLE_TIMEOUT", 300)),
+)
+
+# politeness per host, shared by all the scrapers, ramps up while a site answers and backs off when it throttles
+rate_limiter = RateLimiter(
+    initial_rate=float(os.getenv("RATE_LIMIT_INITIAL", 0.5)),
+    max_rate=float(os.getenv("RATE_LIMIT_MAX", 5)),
+)
+
+# health of the proxies, requests go through the healthy ones and a retry through another one
+proxy_pool = ProxyPool(
+    failure_threshold=int(os.getenv("PROXY_FAILURE_THRESHOLD", 3)),
+    quarantine=float(os.getenv("PROXY_QUARANTINE_SECONDS", 60)),
+    max_quarantine=float(os.getenv("PROXY_MAX_QUARANTINE_SECONDS", 900)),
+)
+
+# HTTP_CACHE_OFFLINE=1 replays the scrapers from the cached pages: the rows are dated from the day of the
+# replay, so they go to <REPLAY_DIR>/data instead of data/, and the crawl state of the live runs is left alone
+REPLAY = os.getenv("HTTP_CACHE_OFFLINE", "0") == "1"
+REPLAY_DIR = os.getenv("REPLAY_DIR", "replay")
+
+# where the scraped rows are saved, csv files or a parquet dataset (STORAGE_SINK)
+sink = get_sink(base_dir=REPLAY_DIR if REPLAY else ".")
+
+# the response cache and the crawl frontier are sqlite files under cache/, only opened by a scraper run:
+# importing the scrapers (parser processes, benchmarks, notebook) creates no file
+_response_cache = None
+_crawl_frontier = None
+_state_lock = threading.Lock()
+
+
+# USE_PROXIES=0 sends the requests directly, e.g. to a local test server
+USE_PROXIES = os.getenv("USE_PROXIES", "1") == "1"
+
+# base of the exponential backoff between two attempts of a request, in seconds
+RETRY_DELAY = float(os.getenv("RETRY_DELAY", 1))
+
+
+@lru_cache(maxsize=None)
+def get_proxy_credentials(rotating: bool) -> tuple:
+    # (username, password, rotating endpoint) read once from the environment
+    if rotating:
+        rotating_proxy_domain_name = os.getenv("ROTATING_PROXY_DOMAINE_NAME_EBAY")
+        rotating_proxy_port = os.getenv("ROTATING_PROXY_PORT_EBAY")
+        return (
+            os.getenv("ROTATING_PROXY_USERNAME_EBAY"),
+            os.getenv("ROTATING_PROXY_PASSWORD_EBAY"),
+            f"{rotating_proxy_domain_name}:{rotating_proxy_port}",
+        )
+    return (os.getenv("PROXY_USERNAME_RELIANCE_DIGITAL"), os.getenv("PROXY_PASSWORD_RELIANCE_DIGITAL"), None)
+
+
+@lru_cache(maxsize=None)
+def build_proxy(proxy_username: str, proxy_password: str, proxy_address: str) -> dict:
+    return {
+        "http": f"http://{proxy_username}:{proxy_password}@{proxy_address}",
+        "https": f"http://{proxy_username}:{proxy_password}@{proxy_address}"
+    }
+
+
+def get_response_cache() -> ResponseCache:
+    """Pages already fetched, served again without a request while fresh, revalidated after (HTTP_CACHE=0 disables it)."""
+    global _response_cache
+    if os.getenv("HTTP_CACHE", "1") != "1":
+        return None
+    with _state_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(
+                directory=os.getenv("HTTP_CACHE_DIR", "cache/http"),
+                ttl=float(os.getenv("HTTP_CACHE_TTL", 3600)),
+                max_bytes=int(float(os.getenv("HTTP_CACHE_MAX_MB", 1024)) * 1024 * 1024),
+                offline=REPLAY,
+            )
+        return _response_cache
+
+
+def get_crawl_frontier() -> CrawlFrontier:
+    """Pending / in flight / done / failed pages of every site and category, to resume an interrupted crawl."""
+    global _crawl_frontier
+    with _state_lock:
+        if _crawl_frontier is None:
+            # a replay goes over every cached page, whatever the live runs already scraped
+            _crawl_frontier = CrawlFrontier(":memory:" if REPLAY else os.getenv("CRAWL_STATE_DB", "cache/crawl_state.db"))
+        return _crawl_frontier
+
+
+def log_errors(site: str, directory: str = "logs") -> logging.Logger:
+    """Logger of a site, its errors go to <directory>/<site>_scraping_errors.log whichever entry point runs it."""
+    logger = logging.getLogger(site)
+    logger.setLevel(logging.ERROR)
+    path = os.path.abspath(os.path.join(directory, f"{site}_scraping_errors.log"))
+    if not any(getattr(handler, "baseFilename", None) == path for handler in logger.handlers):
+        handler = logging.FileHandler(path)
+        handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        logger.addHandler(handler)
+    return logger
+
+
+def retry_after_seconds(response) -> float:
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def choose_proxy(proxies: list, withProxy: bool, tried_proxies: list) -> tuple:
+    """(requests proxies, proxy address) of the next attempt of a request, a proxy it did not try yet when there is one."""
+    if not (withProxy and USE_PROXIES):
+        return None, None
+    if len(proxies) > 0:
+        proxy_username, proxy_password, _ = get_proxy_credentials(rotating=False)
+        proxy_address = proxy_pool.choose(proxies, exclude=tried_proxies)
+    else:
+        proxy_username, proxy_password, proxy_address = get_proxy_credentials(rotating=True)
+    tried_proxies.append(proxy_address)
+    return build_proxy(proxy_username, proxy_password, proxy_address), proxy_address
+
+
+def get_with_retries(url: str, headers: dict, proxies: list = [], withProxy: bool = True, retries: int = 5, delay: float = RETRY_DELAY, site: str = None):
+    response_cache = get_response_cache()
+    cached = response_cache.lookup(url) if response_cache else None
+    if cached is not None and response_cache.is_fresh(cached):
+        response = response_cache.response(cached)
+        if response is not None:
+            metrics.count("http_cache_total", site=site, result="hit")
+            return response
+        cached = None  # evicted by another thread since the lookup
+    if response_cache and response_cache.offline:
+        raise Exception(f"{url} is not in the response cache (HTTP_CACHE_OFFLINE=1).")
+    request_headers = headers
+    if cached is not None:
+        # a stale page is only downloaded again if it changed
+        request_headers = {**headers, **cached.validators()}
+
+    host = urlparse(url).netloc
+    tried_proxies = []
 
     for attempt in range(retries):
+        proxy, proxy_address = choose_proxy(proxies, withProxy, tried_proxies)
+        proxy_label = proxy_address or "direct"
+        session = session_pool.get(site, proxy_address)
+        if attempt > 0:
+            metrics.count("http_retries_total", site=site, proxy=proxy_label)
+        rate_limiter.acquire(host)
         try:
-            if withProxy:
-                response = requests.get(url, headers=headers, timeout=10, proxies=proxy)
-            else:
-                response = requests.get(url, headers=headers, timeout=10)
+            start = time.perf_counter()
+            with stage("fetch", site=site, proxy=proxy_label):
+                response = session.get(url, headers=request_headers, timeout=10, proxies=proxy)
+            proxy_pool.record(proxy_address, response.status_code, latency=time.perf_counter() - start)
+            metrics.count("http_responses_total", site=site, proxy=proxy_label, status=response.status_code)
+            rate_limiter.record(host, response.status_code, retry_after=retry_after_seconds(response))
+            if response.status_code == 304 and cached is not None:
+                revalidated = response_cache.revalidated(cached, response)
+                if revalidated is not None:
+                    metrics.count("http_cache_total", site=site, result="revalidated")
+                    return revalidated
+                # the body was evicted while the page was revalidated, download it again without the validators
+                cached = None
+                request_headers = headers
+                continue
             response.raise_for_status()
+            if response_cache:
+                metrics.count("http_cache_total", site=site, result="miss")
+                response_cache.store(url, response)
             return response
         except requests.exceptions.RequestException as e:
+            if e.response is None:
+                # no answer at all: timeout, connection or proxy error
+                proxy_pool.record(proxy_address, error=e)
+                metrics.count("http_responses_total", site=site, proxy=proxy_label, status=type(e).__name__)
+            if isinstance(e, requests.exceptions.Timeout):
+                rate_limiter.record(host, timed_out=True)
             print(f"Attempt {attempt + 1} failed: {e}")
-            time.sleep(delay)
+        finally:
+            # a probe ended by any other error must not keep the proxy out of the pool
+            proxy_pool.release(proxy_address)
+        time.sleep(backoff_delay(attempt, base=delay))
+    metrics.count("http_failures_total", site=site)
     raise Exception(f"Failed to fetch {url} after {retries} retries.")
 
 
-def load_visited_urls(file_path: str) -> set:
-    # Load previously visited URLs (if available)
-    try:
-        with open(file_path, "r") as f:
-            return set(map(lambda url: url.strip("\n"), f.readlines()))
-    except FileNotFoundError:
-        return set()
-    
-
-def save_to_csv(file_path: str, data: list, category: str, processed_categories: set) -> None:
+def save_data(site: str, category: str, data: list, processed_categories: set) -> None:
     if len(data) > 0:
-        df = pd.DataFrame(data)
-        category_not_in_processed_categories = category not in processed_categories
-        df.to_csv(file_path, index=False, mode="a", header=category_not_in_processed_categories)
-        if category_not_in_processed_categories:
-            processed_categories.add(category) # ensure headers are only written once
+        with stage("save", site=site):
+            written = sink.write(site, category, data, processed_categories)
+        metrics.count("saved_rows_total", len(data), site=site)
+        metrics.count("saved_bytes_total", written, site=site)
         data.clear()
-
-
-def save_visted_url(file_path: str, visited_urls: set):
-    # Save visited URL
-    with open(file_path, "a") as f:
-        f.writelines(f"{url}\n" for url in visited_urls)
-    visited_urls.clear()
-
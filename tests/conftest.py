@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the scraping scripts are imported from the root of the repository, like main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
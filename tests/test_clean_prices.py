@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+from cleaning_data_scripts.cleaning_data_script import clean_price, clean_prices
+
+
+def assert_matches_clean_price(prices: pd.Series):
+    expected = prices.map(clean_price).astype(float)
+    pd.testing.assert_series_equal(clean_prices(prices), expected, check_names=False)
+
+
+@pytest.mark.parametrize("prices", [
+    pytest.param([None, "", "  ", "see price in cart", "US $"], id="missing-and-invalid"),
+    pytest.param([12, 3.5, True, float("nan"), pd.NA, pd.Timestamp("2025-01-01"), "US $10.00"], id="non-str"),
+    pytest.param(["US $1,299.99", "₹1,24,999", "EUR 12,345.60", "$1,000,000"], id="thousands-separators"),
+    pytest.param(["US $10.00", "EUR 10.00", "GBP 10.00", "AU $10.00", "C $10.00", "₹1,000", "$10.00", "10.00"], id="currency-prefixes"),
+    pytest.param(["$1.005", "$2.675", "$0.125", "EUR 1.015", "C $2.50", "GBP 0.285", "₹1,234.5"], id="half-cents"),
+    pytest.param(["US $10.00", "US $10.00", None, "US $10.00", None], id="repeated-prices"),
+])
+def test_clean_prices_matches_clean_price(prices):
+    assert_matches_clean_price(pd.Series(prices, dtype=object))
+
+
+@pytest.mark.parametrize("prices", [
+    pytest.param(pd.Series([10.0, 12.5, None]), id="float"),
+    pytest.param(pd.Series([10, 12, 15]), id="int"),
+    pytest.param(pd.Series([], dtype=object), id="empty"),
+])
+def test_clean_prices_of_numeric_column(prices):
+    # a column already converted has no price strings left, both give missing prices
+    assert_matches_clean_price(prices)
+
+
+def test_clean_prices_keeps_the_index():
+    prices = pd.Series(["US $10.00", None, "₹1,000"], index=[5, 3, 9], dtype=object)
+    assert list(clean_prices(prices).index) == [5, 3, 9]
+    assert_matches_clean_price(prices)
@@ -0,0 +1,41 @@
+import glob
+import os
+import pytest
+from scraping_scripts import parsers
+from scraping_scripts.parser_parity import extract_links, extract_rows
+
+# saved pages of each site: pages/<site>/<category>_<item|listing>.html
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+
+pytestmark = pytest.mark.skipif(parsers.lxml_html is None, reason="lxml is not installed")
+
+
+def saved_pages(kind: str, sites: tuple = ("ebay", "flipkart", "reliancedigital")) -> list:
+    # (site, category, path) of the saved pages of a kind
+    return [
+        pytest.param(site, os.path.basename(path).split("_")[0], path, id=f"{site}/{os.path.basename(path)}")
+        for site in sites
+        for path in sorted(glob.glob(os.path.join(PAGES_DIR, site, f"*_{kind}.html")))
+    ]
+
+
+def read_page(path: str) -> str:
+    with open(path, encoding="utf-8") as file:
+        return file.read()
+
+
+# flipkart reads its rows from the listing pages, the other sites from the product pages
+@pytest.mark.parametrize("site, category, path", saved_pages("item", ("ebay", "reliancedigital")) + saved_pages("listing", ("flipkart",)))
+def test_extract_data_rows_match(site, category, path):
+    html = read_page(path)
+    expected = extract_rows(site, html, category, backend="bs4")
+    assert expected, "the page should have rows"
+    assert extract_rows(site, html, category, backend="lxml") == expected
+
+
+@pytest.mark.parametrize("site, category, path", saved_pages("listing", ("ebay", "reliancedigital")))
+def test_product_links_match(site, category, path):
+    html = read_page(path)
+    expected = extract_links(site, html, backend="bs4")
+    assert expected, "the page should have product links"
+    assert extract_links(site, html, backend="lxml") == expected